@@ -1,9 +1,10 @@
 from typing import List
 from crewai import Agent, Crew, Process, Task
-from crewai.project import CrewBase, agent, crew, task
+from crewai.project import CrewBase, after_kickoff, agent, crew, task
 
 from tools.calculator_tool import CalculatorTool
 from tools.sec_tools import SEC10KTool, SEC10QTool
+from tools.tracing import TracedLLM, tracer
 
 from crewai_tools import WebsiteSearchTool, ScrapeWebsiteTool, TXTSearchTool
 
@@ -25,11 +26,29 @@ llm = LLM(
     stop=["END"],
     seed=42
 )
+# 记录每次LLM调用的耗时与token数
+llm = TracedLLM(llm)
 
 @CrewBase
 class StockAnalysisCrew:
     agents_config = 'config/agents.yaml'
     tasks_config = 'config/tasks.yaml'
+
+    @after_kickoff
+    def report_trace(self, output):
+        if tracer.summary():
+            print(tracer.summary())
+        return output
+
+    def kickoff(self, inputs=None):
+        """运行一次分析；kickoff 抛出异常时同样结束本次追踪并导出"""
+        tracer.begin()
+        try:
+            return self.crew().kickoff(inputs=inputs)
+        finally:
+            paths = tracer.end()
+            if paths:
+                print(f"Trace exported: {paths[0]}, {paths[1]}")
     
     @agent
     def financial_agent(self) -> Agent:
@@ -6,7 +6,7 @@ def run():
         'query': 'What is the company you want to analyze?',
         'company_stock': 'AMZN',
     }
-    return StockAnalysisCrew().crew().kickoff(inputs=inputs)
+    return StockAnalysisCrew().kickoff(inputs=inputs)
 
 def train():
     """
@@ -4,6 +4,8 @@ import operator
 import re
 from crewai_tools import RagTool
 
+from .tracing import traced
+
 
 class CalculatorTool(RagTool):
     name: str = "Calculator tool"
@@ -11,6 +13,7 @@ class CalculatorTool(RagTool):
         "Useful to perform any mathematical calculations, like sum, minus, multiplication, division, etc. The input to this tool should be a mathematical  expression, a couple examples are `200*7` or `5000/2*10."
     )
 
+    @traced("tool")
     def _run(self, operation: str) -> float:
         try:
             # Define allowed operators for safe evaluation
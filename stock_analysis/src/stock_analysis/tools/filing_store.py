@@ -0,0 +1,164 @@
+"""
+SEC文件本地存储
+按 (股票代码, 表单类型, accession号) 保存文件的原始HTML和清洗后的文本：<目录>/<代码>/<表单>/<accession>/，
+latest.json 记录最近一次查询到的最新文件与查询时间。检查间隔内直接使用本地文件，
+超过间隔才查询一次最新文件，accession号未变时不再下载，重启crew不会重复下载未更新的10-K
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+
+SEC_FILING_DIR = os.path.expanduser(os.getenv("SEC_FILING_DIR", os.path.join("~", ".stock_analysis", "filings")))
+
+# 两次查询最新文件之间的最短间隔（小时），0 表示每次都查询（accession号未变时仍不下载）
+SEC_FILING_CHECK_HOURS = float(os.getenv("SEC_FILING_CHECK_HOURS", "24"))
+
+# 文本清洗规则的版本，规则变化时由已保存的HTML重新生成文本，无需重新下载
+CLEAN_VERSION = 1
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9.\-]", "_", name)
+
+
+def accession_of(filing: dict) -> str:
+    """文件的accession号；缺失时用文件链接的摘要代替"""
+    accession = filing.get("accessionNo")
+    if accession:
+        return _safe(str(accession))
+    link = str(filing.get("linkToFilingDetails", ""))
+    return "url-" + hashlib.sha1(link.encode("utf-8")).hexdigest()[:16]
+
+
+class FilingStore:
+    """SEC文件的本地存储，同一 (代码, 表单) 的查询与下载在进程内串行执行"""
+
+    def __init__(self, root: str = SEC_FILING_DIR, check_hours: float = SEC_FILING_CHECK_HOURS):
+        self.root = root
+        self.check_seconds = check_hours * 3600
+        self._lock = threading.Lock()
+        self._key_locks: dict = {}
+
+    def _dir(self, ticker: str, form: str, accession: Optional[str] = None) -> str:
+        parts = [self.root, _safe(ticker.upper()), _safe(form.upper())]
+        if accession:
+            parts.append(accession)
+        return os.path.join(*parts)
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _write_json(self, path: str, data: dict) -> None:
+        self._write(path, json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"))
+
+    def latest(self, ticker: str, form: str) -> Optional[dict]:
+        """最近一次查询记录：accession、filed_at、url、checked_at"""
+        return self._read_json(os.path.join(self._dir(ticker, form), "latest.json"))
+
+    def has(self, ticker: str, form: str, accession: str) -> bool:
+        return os.path.exists(os.path.join(self._dir(ticker, form, accession), "filing.html"))
+
+    def read_text(self, ticker: str, form: str, accession: str, clean: Callable[[bytes], str]) -> str:
+        """读取清洗后的文本；清洗规则版本不一致时由保存的HTML重新生成"""
+        directory = self._dir(ticker, form, accession)
+        meta = self._read_json(os.path.join(directory, "meta.json")) or {}
+        text_path = os.path.join(directory, "filing.txt")
+        if meta.get("clean_version") == CLEAN_VERSION and os.path.exists(text_path):
+            with open(text_path, "r", encoding="utf-8") as f:
+                return f.read()
+        with open(os.path.join(directory, "filing.html"), "rb") as f:
+            text = clean(f.read())
+        self._write(text_path, text.encode("utf-8"))
+        self._write_json(os.path.join(directory, "meta.json"), {**meta, "clean_version": CLEAN_VERSION})
+        return text
+
+    def save(self, ticker: str, form: str, filing: dict, html: bytes, text: str) -> str:
+        accession = accession_of(filing)
+        directory = self._dir(ticker, form, accession)
+        self._write(os.path.join(directory, "filing.html"), html)
+        self._write(os.path.join(directory, "filing.txt"), text.encode("utf-8"))
+        self._write_json(os.path.join(directory, "meta.json"), {
+            "ticker": ticker.upper(),
+            "form": form.upper(),
+            "accession": accession,
+            "filed_at": filing.get("filedAt"),
+            "url": filing.get("linkToFilingDetails"),
+            "downloaded_at": time.time(),
+            "clean_version": CLEAN_VERSION,
+        })
+        return accession
+
+    def _mark_latest(self, ticker: str, form: str, filing: dict) -> None:
+        self._write_json(os.path.join(self._dir(ticker, form), "latest.json"), {
+            "accession": accession_of(filing),
+            "filed_at": filing.get("filedAt"),
+            "url": filing.get("linkToFilingDetails"),
+            "checked_at": time.time(),
+        })
+
+    def get_text(self, ticker: str, form: str,
+                 query_latest: Callable[[], Optional[dict]],
+                 download: Callable[[dict], bytes],
+                 clean: Callable[[bytes], str]) -> Optional[str]:
+        """
+        返回最新文件的清洗文本：
+        - 检查间隔内且本地已有该文件时直接读取，不访问网络；
+        - 否则调用 query_latest 查询最新文件，accession号已保存时只更新查询时间，新文件才 download 并保存；
+        - 查询或下载失败时退回本地已保存的最新文件，没有则抛出原异常；
+        - 查询没有返回文件时同样退回本地已保存的最新文件。
+        本地和查询结果都没有文件时返回 None。
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault((ticker.upper(), form.upper()), threading.Lock())
+        with key_lock:
+            pointer = self.latest(ticker, form)
+            if pointer and time.time() - pointer.get("checked_at", 0) < self.check_seconds \
+                    and self.has(ticker, form, pointer["accession"]):
+                return self.read_text(ticker, form, pointer["accession"], clean)
+            try:
+                filing = query_latest()
+                if filing is None:
+                    # 查询没有返回文件（如接口暂时无结果）时同样退回本地已保存的文件
+                    if pointer and self.has(ticker, form, pointer["accession"]):
+                        return self.read_text(ticker, form, pointer["accession"], clean)
+                    return None
+                accession = accession_of(filing)
+                if not self.has(ticker, form, accession):
+                    html = download(filing)
+                    self.save(ticker, form, filing, html, clean(html))
+                self._mark_latest(ticker, form, filing)
+                return self.read_text(ticker, form, accession, clean)
+            except Exception:
+                if pointer and self.has(ticker, form, pointer["accession"]):
+                    print(f"Could not refresh {form} for {ticker}, using stored filing {pointer['accession']}")
+                    return self.read_text(ticker, form, pointer["accession"], clean)
+                raise
+
+
+_store: Optional[FilingStore] = None
+
+
+def get_filing_store() -> FilingStore:
+    global _store
+    if _store is None:
+        _store = FilingStore()
+    return _store
@@ -0,0 +1,104 @@
+"""
+录制/回放模块
+record 模式下把SEC接口（QueryApi）和网页下载（requests.get）的响应保存为本地fixture，
+replay 模式下直接读取fixture返回，可注入固定或录制时的延迟，使运行在离线机器上可复现
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import requests
+from sec_api import QueryApi
+
+
+# off（直连）/ record（请求并录制）/ replay（只读fixture，不访问网络）
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off").lower()
+REPLAY_MODES = ("off", "record", "replay")
+
+REPLAY_FIXTURE_DIR = os.getenv("REPLAY_FIXTURE_DIR", os.path.join(os.path.expanduser("~"), ".stock_analysis", "fixtures"))
+
+# 回放时注入的延迟：毫秒数，或 recorded 表示按录制时的实际耗时
+REPLAY_LATENCY_MS = os.getenv("REPLAY_LATENCY_MS", "0")
+
+
+class FixtureNotFoundError(LookupError):
+    """回放模式下找不到对应请求的fixture"""
+
+
+class FixtureStore:
+    """按 (接口名, 请求参数) 保存响应：<目录>/<接口名>/<参数摘要>.pkl，旁边的 .json 记录参数与耗时"""
+
+    def __init__(self, root: str = REPLAY_FIXTURE_DIR, mode: str = REPLAY_MODE,
+                 latency_ms: str = REPLAY_LATENCY_MS):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unsupported REPLAY_MODE: {mode} (expected one of {', '.join(REPLAY_MODES)})")
+        self.root = root
+        self.mode = mode
+        self.latency_ms = latency_ms
+
+    def call(self, endpoint: str, request: Any, func: Callable[[], Any]) -> Any:
+        """按当前模式执行一次请求，request 为用于匹配fixture的请求参数"""
+        if self.mode == "off":
+            return func()
+        key = hashlib.sha1(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        base = os.path.join(self.root, endpoint, key)
+        if self.mode == "replay":
+            if not os.path.exists(f"{base}.pkl"):
+                raise FixtureNotFoundError(f"No recorded response for {endpoint} ({key}); run once with REPLAY_MODE=record")
+            with open(f"{base}.pkl", "rb") as f:
+                result = pickle.load(f)
+            self._sleep(f"{base}.json")
+            return result
+        started = time.perf_counter()
+        result = func()
+        meta = {"endpoint": endpoint, "request": request, "recorded_at": time.time(),
+                "duration": time.perf_counter() - started}
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{base}.pkl.{suffix}", "wb") as f:
+            pickle.dump(result, f)
+        os.replace(f"{base}.pkl.{suffix}", f"{base}.pkl")
+        with open(f"{base}.json.{suffix}", "w", encoding="utf-8") as f:
+            json.dump(meta, f, default=str)
+        os.replace(f"{base}.json.{suffix}", f"{base}.json")
+        return result
+
+    def _sleep(self, meta_path: str) -> None:
+        if self.latency_ms == "recorded":
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    time.sleep(json.load(f).get("duration", 0))
+            except (OSError, ValueError):
+                pass
+            return
+        delay = float(self.latency_ms or 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+
+_store: Optional[FixtureStore] = None
+
+
+def get_fixture_store() -> FixtureStore:
+    global _store
+    if _store is None:
+        _store = FixtureStore()
+    return _store
+
+
+def get_filings(query: dict) -> dict:
+    """QueryApi.get_filings；回放模式下不需要SEC_API_API_KEY"""
+    return get_fixture_store().call(
+        "sec_api.get_filings", query,
+        lambda: QueryApi(api_key=os.environ['SEC_API_API_KEY']).get_filings(query),
+    )
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """requests.get；fixture按URL匹配（请求头不参与匹配）"""
+    return get_fixture_store().call("http_get", url, lambda: requests.get(url, **kwargs))
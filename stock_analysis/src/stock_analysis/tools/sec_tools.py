@@ -1,12 +1,72 @@
-import os
 from typing import Any, Optional, Type
 from pydantic.v1 import BaseModel, Field
 from crewai_tools import RagTool
-from sec_api import QueryApi  # Make sure to have sec_api installed
 import requests
 import html2text
 import re
 
+from .filing_store import get_filing_store
+from .replay import get_filings, http_get
+from .tracing import payload_size, traced, tracer
+
+
+SEC_HEADERS = {
+    "User-Agent": "crewai.com bisan@crewai.com",
+    "Accept-Encoding": "gzip, deflate",
+    "Host": "www.sec.gov"
+}
+
+
+def _query_latest_filing(stock_name: str, form_type: str) -> Optional[dict]:
+    """Queries the SEC API for the latest filing of the given form type."""
+    query = {
+        "query": {
+            "query_string": {
+                "query": f"ticker:{stock_name} AND formType:\"{form_type}\""
+            }
+        },
+        "from": "0",
+        "size": "1",
+        "sort": [{ "filedAt": { "order": "desc" }}]
+    }
+    with tracer.span("source", "sec_api.get_filings"):
+        filings = get_filings(query)['filings']
+    return filings[0] if filings else None
+
+
+def _download_filing(filing: dict) -> bytes:
+    with tracer.span("source", "sec.filing_document") as record:
+        response = http_get(filing['linkToFilingDetails'], headers=SEC_HEADERS)
+        record.set(status=response.status_code, **payload_size(response.content))
+    response.raise_for_status()  # Raise an exception for HTTP errors
+    return response.content
+
+
+def _clean_filing(html: bytes) -> str:
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    text = h.handle(html.decode("utf-8"))
+
+    # Removing all non-English words, dollar signs, numbers, and newlines from text
+    return re.sub(r"[^a-zA-Z$0-9\s\n]", "", text)
+
+
+def latest_filing_text(stock_name: str, form_type: str) -> Optional[str]:
+    """
+    Returns the cleaned text of the latest filing, served from the local filing store
+    and only downloaded again when a newer accession number exists.
+    """
+    text = get_filing_store().get_text(
+        stock_name, form_type,
+        query_latest=lambda: _query_latest_filing(stock_name, form_type),
+        download=_download_filing,
+        clean=_clean_filing,
+    )
+    if text is None:
+        print("No filings found for this stock.")
+    return text
+
+
 # 为了兼容 Pydantic v2 API，添加一个兼容层
 class CompatibilityBaseModel(BaseModel):
     @classmethod
@@ -67,37 +127,7 @@ class SEC10KTool(RagTool):
     def get_10k_url_content(self, stock_name: str) -> Optional[str]:
         """Fetches the URL content as txt of the latest 10-K form for the given stock name."""
         try:
-            queryApi = QueryApi(api_key=os.environ['SEC_API_API_KEY'])
-            query = {
-                "query": {
-                    "query_string": {
-                        "query": f"ticker:{stock_name} AND formType:\"10-K\""
-                    }
-                },
-                "from": "0",
-                "size": "1",
-                "sort": [{ "filedAt": { "order": "desc" }}]
-            }
-            filings = queryApi.get_filings(query)['filings']
-            if len(filings) == 0:
-                print("No filings found for this stock.")
-                return None
-
-            url = filings[0]['linkToFilingDetails']
-            
-            headers = {
-                "User-Agent": "crewai.com bisan@crewai.com",
-                "Accept-Encoding": "gzip, deflate",
-                "Host": "www.sec.gov"
-            }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()  
-            h = html2text.HTML2Text()
-            h.ignore_links = False
-            text = h.handle(response.content.decode("utf-8"))
-
-            text = re.sub(r"[^a-zA-Z$0-9\s\n]", "", text)
-            return text
+            return latest_filing_text(stock_name, "10-K")
         except requests.exceptions.HTTPError as e:
             print(f"HTTP error occurred: {e}")
             return None
@@ -109,6 +139,7 @@ class SEC10KTool(RagTool):
         # Don't set data_type since the current version of crewai_tools doesn't expect it this way
         super().add(*args, **kwargs)
 
+    @traced("tool")
     def _run(self, search_query: str, **kwargs: Any) -> Any:
         return super()._run(query=search_query, **kwargs)
 
@@ -147,38 +178,7 @@ class SEC10QTool(RagTool):
     def get_10q_url_content(self, stock_name: str) -> Optional[str]:
         """Fetches the URL content as txt of the latest 10-Q form for the given stock name."""
         try:
-            queryApi = QueryApi(api_key=os.environ['SEC_API_API_KEY'])
-            query = {
-                "query": {
-                    "query_string": {
-                        "query": f"ticker:{stock_name} AND formType:\"10-Q\""
-                    }
-                },
-                "from": "0",
-                "size": "1",
-                "sort": [{ "filedAt": { "order": "desc" }}]
-            }
-            filings = queryApi.get_filings(query)['filings']
-            if len(filings) == 0:
-                print("No filings found for this stock.")
-                return None
-
-            url = filings[0]['linkToFilingDetails']
-            
-            headers = {
-                "User-Agent": "crewai.com bisan@crewai.com",
-                "Accept-Encoding": "gzip, deflate",
-                "Host": "www.sec.gov"
-            }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-            h = html2text.HTML2Text()
-            h.ignore_links = False
-            text = h.handle(response.content.decode("utf-8"))
-
-            # Removing all non-English words, dollar signs, numbers, and newlines from text
-            text = re.sub(r"[^a-zA-Z$0-9\s\n]", "", text)
-            return text
+            return latest_filing_text(stock_name, "10-Q")
         except requests.exceptions.HTTPError as e:
             print(f"HTTP error occurred: {e}")
             return None
@@ -190,6 +190,7 @@ class SEC10QTool(RagTool):
         # Don't set data_type since the current version of crewai_tools doesn't expect it this way
         super().add(*args, **kwargs)
 
+    @traced("tool")
     def _run(self, search_query: str, **kwargs: Any) -> Any:
         return super()._run(query=search_query, **kwargs)
 
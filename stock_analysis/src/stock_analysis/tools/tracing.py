@@ -0,0 +1,312 @@
+"""
+运行追踪模块
+为工具调用、数据源接口调用和LLM调用记录span（耗时、数据量、缓存命中、token数），
+运行结束后导出为JSON Lines明细和Prometheus textfile，用于按接口统计延迟分布
+"""
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from crewai import BaseLLM
+
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# 追踪文件目录
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(os.path.expanduser("~"), ".stock_analysis", "traces"))
+
+# Prometheus指标名前缀与耗时直方图分桶（秒）
+METRIC_PREFIX = "stock_analysis"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """一次调用的记录；duration 为 None 表示瞬时事件"""
+
+    __slots__ = ("span_id", "parent_id", "kind", "name", "start", "duration", "attrs", "error", "thread")
+
+    def __init__(self, kind: str, name: str, parent_id: Optional[int], attrs: Dict[str, Any]):
+        self.span_id = next(_span_ids)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.name = name
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration": None if self.duration is None else round(self.duration, 6),
+            "thread": self.thread,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class _NullSpan:
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def payload_size(value: Any) -> Dict[str, int]:
+    """返回值的数据量：文本按UTF-8字节数，DataFrame按内存占用和行数"""
+    if value is None:
+        return {}
+    if isinstance(value, str):
+        return {"payload_bytes": len(value.encode("utf-8"))}
+    if isinstance(value, (bytes, bytearray)):
+        return {"payload_bytes": len(value)}
+    if hasattr(value, "memory_usage") and hasattr(value, "__len__"):
+        try:
+            return {"payload_bytes": int(value.memory_usage(deep=True).sum()), "rows": len(value)}
+        except Exception:
+            return {"rows": len(value)}
+    return {}
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Tracer:
+    """进程内的span收集器；begin/end 可嵌套，最外层 end 时导出本次运行的全部span"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+        self._active = 0
+        self.run_id: Optional[str] = None
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs):
+        """记录一段调用的耗时，异常原样抛出并记入 error；不在 begin/end 之间时不记录"""
+        if not TRACE_ENABLED or not self._active:
+            yield _NULL_SPAN
+            return
+        parent = _current.get()
+        span = Span(kind, name, parent.span_id if parent else None, attrs)
+        token = _current.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            _current.reset(token)
+            with self._lock:
+                self._spans.append(span)
+
+    def event(self, kind: str, name: str, **attrs) -> None:
+        """记录瞬时事件"""
+        if not TRACE_ENABLED or not self._active:
+            return
+        parent = _current.get()
+        span = Span(kind, name, parent.span_id if parent else None, attrs)
+        with self._lock:
+            self._spans.append(span)
+
+    def begin(self) -> None:
+        with self._lock:
+            if self._active == 0:
+                self._spans.clear()
+                self.run_id = datetime.now().strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+            self._active += 1
+
+    def end(self, directory: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """结束一次运行；最外层结束时导出并返回 (jsonl路径, prom路径)"""
+        with self._lock:
+            self._active = max(self._active - 1, 0)
+            if self._active:
+                return None
+        if not TRACE_ENABLED:
+            return None
+        return self.export(directory)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def export(self, directory: Optional[str] = None) -> Tuple[str, str]:
+        directory = directory or TRACE_DIR
+        os.makedirs(directory, exist_ok=True)
+        run_id = self.run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+        jsonl_path = os.path.join(directory, f"trace-{run_id}.jsonl")
+        prom_path = os.path.join(directory, f"{METRIC_PREFIX}.prom")
+        self.export_jsonl(jsonl_path)
+        self.export_prometheus(prom_path)
+        return jsonl_path, prom_path
+
+    def export_jsonl(self, path: str) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for span in self.spans():
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp_path, path)
+
+    def export_prometheus(self, path: str) -> None:
+        """写入node_exporter textfile collector格式，写临时文件后替换，避免被读到半个文件"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def prometheus_text(self) -> str:
+        durations: Dict[tuple, List[float]] = defaultdict(list)
+        payload: Dict[tuple, int] = defaultdict(int)
+        errors: Dict[tuple, int] = defaultdict(int)
+        cache: Dict[tuple, int] = defaultdict(int)
+        tokens: Dict[tuple, int] = defaultdict(int)
+        for span in self.spans():
+            key = (span.kind, span.name)
+            if span.duration is not None:
+                durations[key].append(span.duration)
+            payload[key] += span.attrs.get("payload_bytes", 0)
+            if span.error:
+                errors[key] += 1
+            if "cache" in span.attrs:
+                cache[key + (span.attrs["cache"],)] += 1
+            for kind in ("prompt", "completion"):
+                if f"{kind}_tokens" in span.attrs:
+                    tokens[key + (kind,)] += span.attrs[f"{kind}_tokens"]
+
+        p = METRIC_PREFIX
+        lines = [f"# HELP {p}_span_duration_seconds 调用耗时", f"# TYPE {p}_span_duration_seconds histogram"]
+        for (kind, name), values in sorted(durations.items()):
+            labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+            for bound in LATENCY_BUCKETS:
+                count = sum(1 for v in values if v <= bound)
+                lines.append(f'{p}_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{p}_span_duration_seconds_bucket{{{labels},le="+Inf"}} {len(values)}')
+            lines.append(f"{p}_span_duration_seconds_sum{{{labels}}} {sum(values):.6f}")
+            lines.append(f"{p}_span_duration_seconds_count{{{labels}}} {len(values)}")
+
+        lines += [f"# HELP {p}_span_payload_bytes_total 返回数据量", f"# TYPE {p}_span_payload_bytes_total counter"]
+        for (kind, name), value in sorted(payload.items()):
+            if value:
+                lines.append(f'{p}_span_payload_bytes_total{{kind="{_label(kind)}",name="{_label(name)}"}} {value}')
+
+        lines += [f"# HELP {p}_span_errors_total 失败次数", f"# TYPE {p}_span_errors_total counter"]
+        for (kind, name), value in sorted(errors.items()):
+            lines.append(f'{p}_span_errors_total{{kind="{_label(kind)}",name="{_label(name)}"}} {value}')
+
+        lines += [f"# HELP {p}_cache_lookups_total 缓存查询次数", f"# TYPE {p}_cache_lookups_total counter"]
+        for (kind, name, result), value in sorted(cache.items()):
+            lines.append(f'{p}_cache_lookups_total{{kind="{_label(kind)}",name="{_label(name)}",'
+                         f'result="{_label(result)}"}} {value}')
+
+        lines += [f"# HELP {p}_llm_tokens_total LLM token数", f"# TYPE {p}_llm_tokens_total counter"]
+        for (kind, name, token_type), value in sorted(tokens.items()):
+            lines.append(f'{p}_llm_tokens_total{{name="{_label(name)}",type="{token_type}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self, top: int = 5) -> str:
+        """按类型汇总调用次数与耗时，并列出总耗时最高的调用"""
+        totals: Dict[str, List[float]] = defaultdict(list)
+        by_name: Dict[tuple, float] = defaultdict(float)
+        for span in self.spans():
+            if span.duration is None:
+                continue
+            totals[span.kind].append(span.duration)
+            by_name[(span.kind, span.name)] += span.duration
+        if not totals:
+            return ""
+        lines = ["调用耗时：" + "，".join(f"{kind} {len(v)} 次 {sum(v):.1f}s" for kind, v in sorted(totals.items()))]
+        for (kind, name), seconds in sorted(by_name.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  [{kind}] {name}：{seconds:.2f}s")
+        return "\n".join(lines)
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def annotate(**attrs) -> None:
+    """为当前span补充属性（不在span内时忽略）"""
+    current = _current.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def traced(kind: str = "tool") -> Callable:
+    """装饰工具的 _run 方法，以工具名记录span"""
+    def decorator(run: Callable) -> Callable:
+        @wraps(run)
+        def wrapper(self, *args, **kwargs):
+            with tracer.span(kind, self.name) as record:
+                result = run(self, *args, **kwargs)
+                record.set(**payload_size(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def _count_tokens(text: str) -> int:
+    """token数，未安装tiktoken时按4个字符1个token估算"""
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except Exception:
+        return -(-len(text) // 4)
+
+
+class TracedLLM(BaseLLM):
+    """包装任意crewai LLM，每次调用记录llm span（耗时、响应大小、token数）"""
+
+    llm: Any = None
+
+    def __init__(self, llm: BaseLLM):
+        super().__init__(model=llm.model, temperature=llm.temperature, stop=list(llm.stop or []))
+        self.llm = llm
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs) -> Any:
+        # Agent会向LLM追加停止词（如 Observation:），需同步给实际发起请求的LLM
+        self.llm.stop = list(self.stop or [])
+        with tracer.span("llm", self.llm.model) as record:
+            response = self.llm.call(messages, tools=tools, callbacks=callbacks,
+                                     available_functions=available_functions, **kwargs)
+            prompt = messages if isinstance(messages, str) else "\n".join(
+                str(m.get("content") or "") if isinstance(m, dict) else str(m) for m in messages or [])
+            record.set(prompt_tokens=_count_tokens(prompt))
+            if isinstance(response, str):
+                record.set(completion_tokens=_count_tokens(response), **payload_size(response))
+            return response
+
+    def supports_function_calling(self) -> bool:
+        return self.llm.supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self.llm.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.llm.get_context_window_size()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+行情快照按代码查询的微基准
+对比逐行布尔筛选 df[df['代码'] == code] 与快照代码索引 SpotSnapshot.lookup 的单次查询耗时
+"""
+
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+# 添加项目目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.data_cache import SpotSnapshot
+
+
+def make_snapshot_frame(n_symbols: int) -> pd.DataFrame:
+    """构造与 stock_zh_a_spot_em 列结构相近的合成快照"""
+    rng = np.random.default_rng(42)
+    codes = [f"{i:06d}" for i in range(n_symbols)]
+    return pd.DataFrame({
+        '代码': codes,
+        '名称': [f"股票{c}" for c in codes],
+        '最新价': rng.uniform(1, 200, n_symbols).round(2),
+        '涨跌幅': rng.normal(0, 2, n_symbols).round(2),
+        '涨跌额': rng.normal(0, 1, n_symbols).round(2),
+        '成交量': rng.integers(1_000, 10_000_000, n_symbols),
+        '成交额': rng.integers(1_000_000, 1_000_000_000, n_symbols),
+        '最高': rng.uniform(1, 200, n_symbols).round(2),
+        '最低': rng.uniform(1, 200, n_symbols).round(2),
+        '今开': rng.uniform(1, 200, n_symbols).round(2),
+        '昨收': rng.uniform(1, 200, n_symbols).round(2),
+        '市盈率-动态': rng.uniform(5, 80, n_symbols).round(2),
+        '市净率': rng.uniform(0.5, 10, n_symbols).round(2),
+        '总市值': rng.integers(10**8, 10**12, n_symbols),
+        '流通市值': rng.integers(10**8, 10**12, n_symbols),
+    })
+
+
+def bench(n_symbols: int, n_lookups: int = 200) -> None:
+    df = make_snapshot_frame(n_symbols)
+    codes = random.Random(0).choices(df['代码'].tolist(), k=n_lookups)
+
+    build_s = timeit.timeit(lambda: SpotSnapshot(df), number=3) / 3
+    snapshot = SpotSnapshot(df)
+
+    def scan():
+        for code in codes:
+            df[df['代码'] == code].iloc[0]['最新价']
+
+    def indexed():
+        for code in codes:
+            snapshot.lookup(code)['最新价']
+
+    scan_s = min(timeit.repeat(scan, number=1, repeat=3)) / n_lookups
+    index_s = min(timeit.repeat(indexed, number=1, repeat=3)) / n_lookups
+
+    print(f"{n_symbols:>7,} 只股票  建索引 {build_s * 1e3:8.2f} ms  "
+          f"布尔筛选 {scan_s * 1e6:10.1f} µs/次  "
+          f"索引查询 {index_s * 1e6:8.2f} µs/次  "
+          f"加速 {scan_s / index_s:8.0f}x")
+
+
+def main():
+    """主函数"""
+    print("=== 行情快照代码查询基准 ===")
+    for n_symbols in (5_000, 50_000):
+        bench(n_symbols)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准
+在新的解释器进程中测量入口命令和关键模块的启动耗时，并用 python -X importtime 列出耗时最多的顶层导入，
+用于检查 --help 等短命令没有加载crewai、akshare、pandas等重型依赖；
+短命令超出耗时预算或加载了重型依赖时以退出码1结束，可用于CI
+
+用法：
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --top 20
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+
+# (名称, 解释器参数, 是否为短命令)；短命令的耗时应低于 --budget，且不加载 HEAVY_MODULES
+TARGETS = (
+    ("main.py --help", ["main.py", "--help"], True),
+    ("main.py batch --help", ["main.py", "batch", "--help"], True),
+    ("import tools", ["-c", "import tools"], True),
+    ("import tools.tracing", ["-c", "import tools.tracing"], True),
+    ("import tools.data_cache", ["-c", "import tools.data_cache"], True),
+    ("import crew", ["-c", "import crew"], False),
+    ("import tools.a_stock_data_tool", ["-c", "import tools.a_stock_data_tool"], False),
+)
+
+# 不应出现在短命令中的重型依赖
+HEAVY_MODULES = ("crewai", "akshare", "pandas", "litellm", "crewai_tools")
+
+# 解释器启动时自带的导入，不计入排行
+_STARTUP_MODULES = ("site", "encodings", "_frozen_importlib_external")
+
+# -X importtime 输出：import time: self [us] | cumulative | imported package，缩进每两个空格为一层
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="入口命令与模块的启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每个目标的运行次数（取中位数）")
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最多的顶层导入个数")
+    parser.add_argument("--budget", type=float, default=1.0, help="短命令的耗时上限（秒）")
+    return parser.parse_args()
+
+
+def run(args: list, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + args
+    return subprocess.run(command, cwd=PROJECT_DIR, capture_output=True, text=True)
+
+
+def wall_time(args: list, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(args)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def top_imports(stderr: str):
+    """返回 ({模块: 累计秒数}, 已导入的模块名集合)；排行只含入口模块及其直接导入的模块（前两层）"""
+    top, loaded = {}, set()
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)), (len(match.group(3)) - 1) // 2, match.group(4)
+        loaded.add(name.split(".")[0])
+        if depth <= 1 and name not in _STARTUP_MODULES:
+            top[name] = top.get(name, 0) + cumulative / 1e6
+    return top, loaded
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    print(f"=== 启动耗时基准（{sys.executable}，重复 {args.repeat} 次取中位数）===")
+    failures = []
+    for name, target, short in TARGETS:
+        elapsed = wall_time(target, args.repeat)
+        result = run(target, importtime=True)
+        top, loaded = top_imports(result.stderr)
+        heavy = [m for m in HEAVY_MODULES if m in loaded]
+        status = ""
+        if short and elapsed > args.budget:
+            status = f"  超出预算 {args.budget:g}s"
+        if short and heavy:
+            status += "  加载了重型依赖"
+        if status:
+            failures.append(f"{name}（{status.strip()}）")
+        print(f"\n{name:<34} {elapsed * 1e3:>9.1f} ms  退出码 {result.returncode}{status}")
+        print(f"  重型依赖：{', '.join(heavy) if heavy else '无'}")
+        for module, seconds in sorted(top.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {module:<40} {seconds * 1e3:>9.1f} ms")
+
+    if failures:
+        print(f"\n{len(failures)} 个短命令未通过：{'；'.join(failures)}")
+        sys.exit(1)
+    print(f"\n短命令均在 {args.budget:g}s 以内，且未加载重型依赖")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+工具层端到端基准
+基于录制的fixture（REPLAY_MODE=replay，不访问网络）测量三个工具每种数据类型的耗时与峰值内存，
+分单只股票和500只股票批量两种场景，结果追加到JSON Lines历史文件，并与上一次结果对比
+
+用法：
+    python benchmarks/bench_tools.py                    # 回放fixture运行基准
+    python benchmarks/bench_tools.py --record           # 联网运行一次并录制fixture
+    python benchmarks/bench_tools.py --symbols 50 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_CACHE_DIR = os.getenv("A_STOCK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".a_stock_analysis"))
+DEFAULT_HISTORY = os.path.join(BENCH_DIR, "bench_history.jsonl")
+
+# 单只股票场景使用的代码，批量场景从回放的全市场快照中选取
+DEFAULT_SYMBOL = "600519.SH"
+
+# 相对上一次结果变慢/内存增加超过该比例时标记为回归
+REGRESSION_THRESHOLD = 0.10
+
+# (工具, 参数名, 类型)；数据类型与各工具 _run 的分支一一对应
+CASES = (
+    ("AStockDataTool", "data_type", "quote"),
+    ("AStockDataTool", "data_type", "batch"),
+    ("AStockDataTool", "data_type", "daily"),
+    ("AStockDataTool", "data_type", "financial"),
+    ("AStockDataTool", "data_type", "sector"),
+    ("FinancialAnalysisTool", "analysis_type", "ratio"),
+    ("FinancialAnalysisTool", "analysis_type", "trend"),
+    ("FinancialAnalysisTool", "analysis_type", "comparison"),
+    ("MarketSentimentTool", "sentiment_type", "flow"),
+    ("MarketSentimentTool", "sentiment_type", "news"),
+    ("MarketSentimentTool", "sentiment_type", "technical"),
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="A股工具层端到端基准")
+    parser.add_argument("--record", action="store_true", help="联网调用数据源并录制fixture，而不是回放")
+    parser.add_argument("--fixtures", default=os.getenv("REPLAY_FIXTURE_DIR") or os.path.join(DEFAULT_CACHE_DIR, "fixtures"),
+                        help="fixture目录")
+    parser.add_argument("--symbols", type=int, default=500, help="批量场景的股票数量")
+    parser.add_argument("--repeat", type=int, default=5, help="单只股票场景每种类型的重复次数")
+    parser.add_argument("--workers", type=int, default=1, help="批量场景的并发线程数")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="结果历史文件（JSON Lines）")
+    parser.add_argument("--only", default="", help="只运行指定类型，逗号分隔，如 quote,ratio")
+    return parser.parse_args()
+
+
+def setup_environment(args) -> None:
+    """导入工具前设置：回放或录制fixture；本地日线、财务等缓存放到临时目录，保证每次从同一状态开始"""
+    os.environ["REPLAY_MODE"] = "record" if args.record else "replay"
+    os.environ["REPLAY_FIXTURE_DIR"] = args.fixtures
+    os.environ["A_STOCK_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_tools_")
+    sys.path.insert(0, PROJECT_DIR)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def batch_symbols(count: int) -> list:
+    """从全市场快照中选取前 count 只A股"""
+    from tools.data_cache import get_spot_snapshot
+
+    try:
+        snapshot = get_spot_snapshot("stock_zh_a_spot")
+    except Exception:
+        snapshot = get_spot_snapshot("stock_zh_a_spot_em")
+    symbols = []
+    for code in snapshot.df["代码"].astype(str):
+        code = code[-6:]
+        if code[:1] == "6":
+            symbols.append(f"{code}.SH")
+        elif code[:1] in ("0", "3"):
+            symbols.append(f"{code}.SZ")
+        if len(symbols) >= count:
+            break
+    return symbols
+
+
+def _is_error(result) -> bool:
+    # 回放缺失fixture等异常在工具内被捕获，同样以 ToolError 返回
+    from tools.tool_memo import ToolError
+
+    return isinstance(result, ToolError)
+
+
+def measure(func) -> int:
+    """单独测一次峰值内存（tracemalloc会拖慢执行，不与耗时混测）"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_single(tool, arg: str, kind: str, symbol: str, repeat: int) -> dict:
+    call = lambda: tool._run(symbol, **{arg: kind})
+    started = time.perf_counter()
+    result = call()
+    first = time.perf_counter() - started
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    peak = measure(call)
+    return {
+        "first_ms": round(first * 1e3, 3),
+        "median_ms": round(statistics.median(timings) * 1e3, 3),
+        "min_ms": round(min(timings) * 1e3, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "errors": int(_is_error(result)),
+    }
+
+
+def bench_batch(tool, arg: str, kind: str, symbols: list, workers: int) -> dict:
+    if kind == "batch":
+        # 批量行情本身就是一次调用查询全部代码
+        calls = [lambda: tool._run(",".join(symbols), **{arg: kind})]
+    else:
+        calls = [lambda s=s: tool._run(s, **{arg: kind}) for s in symbols]
+
+    def run_all():
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(lambda c: c(), calls))
+        return [c() for c in calls]
+
+    started = time.perf_counter()
+    results = run_all()
+    elapsed = time.perf_counter() - started
+    # 第二遍命中进程内缓存，与第一遍对比可看出缓存的作用
+    started = time.perf_counter()
+    run_all()
+    warm = time.perf_counter() - started
+    peak = measure(run_all)
+    return {
+        "total_ms": round(elapsed * 1e3, 3),
+        "per_symbol_ms": round(elapsed * 1e3 / len(symbols), 3),
+        "warm_total_ms": round(warm * 1e3, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "errors": sum(_is_error(r) for r in results),
+    }
+
+
+def previous_entry(history_path: str, entry: dict):
+    """历史中参数（股票数、重复次数、线程数）相同的最近一次结果"""
+    if not os.path.exists(history_path):
+        return None
+    last = None
+    with open(history_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if all(record.get(k) == entry[k] for k in ("symbols", "repeat", "workers")):
+                last = record
+    return last
+
+
+def compare(current: dict, previous: dict) -> list:
+    """对比同名场景的耗时与内存，返回回归项"""
+    regressions = []
+    for scenario, cases in current["results"].items():
+        for name, metrics in cases.items():
+            before = previous.get("results", {}).get(scenario, {}).get(name)
+            if not before:
+                continue
+            for metric in ("median_ms", "total_ms", "peak_kb"):
+                if metric in metrics and before.get(metric):
+                    change = metrics[metric] / before[metric] - 1
+                    if change > REGRESSION_THRESHOLD:
+                        regressions.append(f"{scenario}/{name} {metric}: {before[metric]} → {metrics[metric]}（+{change:.0%}）")
+    return regressions
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    setup_environment(args)
+
+    from tools.a_stock_data_tool import AStockDataTool
+    from tools.financial_tool import FinancialAnalysisTool
+    from tools.market_sentiment_tool import MarketSentimentTool
+
+    tools = {
+        "AStockDataTool": AStockDataTool(),
+        "FinancialAnalysisTool": FinancialAnalysisTool(),
+        "MarketSentimentTool": MarketSentimentTool(),
+    }
+    only = {k.strip() for k in args.only.split(",") if k.strip()}
+    cases = [c for c in CASES if not only or c[2] in only]
+
+    mode = "录制" if args.record else "回放"
+    print(f"=== 工具层基准（{mode}fixture：{args.fixtures}）===")
+    results = {"single": {}, "batch": {}}
+
+    print(f"\n--- 单只股票 {DEFAULT_SYMBOL}（重复 {args.repeat} 次）---")
+    for tool_name, arg, kind in cases:
+        name = f"{tool_name}.{kind}"
+        metrics = bench_single(tools[tool_name], arg, kind, DEFAULT_SYMBOL, args.repeat)
+        results["single"][name] = metrics
+        print(f"{name:<36} 首次 {metrics['first_ms']:>9.1f} ms  中位 {metrics['median_ms']:>9.2f} ms  "
+              f"峰值内存 {metrics['peak_kb']:>9.1f} KB  错误 {metrics['errors']}")
+
+    symbols = batch_symbols(args.symbols)
+    print(f"\n--- 批量 {len(symbols)} 只股票（{args.workers} 线程）---")
+    for tool_name, arg, kind in cases:
+        name = f"{tool_name}.{kind}"
+        metrics = bench_batch(tools[tool_name], arg, kind, symbols, args.workers)
+        results["batch"][name] = metrics
+        print(f"{name:<36} 总计 {metrics['total_ms']:>10.1f} ms  每只 {metrics['per_symbol_ms']:>8.2f} ms  "
+              f"缓存后 {metrics['warm_total_ms']:>9.1f} ms  峰值内存 {metrics['peak_kb']:>9.1f} KB  "
+              f"错误 {metrics['errors']}")
+
+    if args.record:
+        print("\n录制完成；回放模式下重新运行以获得可比较的结果")
+        return
+
+    entry = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "symbols": len(symbols),
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "results": results,
+    }
+    previous = previous_entry(args.history, entry)
+    with open(args.history, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"\n结果已追加到 {args.history}")
+
+    if previous:
+        regressions = compare(entry, previous)
+        print(f"与上一次（{previous.get('commit')}，{previous.get('timestamp')}）相比：", end="")
+        print("无回归" if not regressions else f"{len(regressions)} 项回归")
+        for line in regressions:
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
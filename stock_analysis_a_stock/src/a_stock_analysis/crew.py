@@ -1,16 +1,19 @@
 from typing import List
 from crewai import Agent, Crew, Process, Task
-from crewai.project import CrewBase, agent, crew, task
-
-from tools.a_stock_data_tool import AStockDataTool
-from tools.financial_tool import FinancialAnalysisTool
-from tools.market_sentiment_tool import MarketSentimentTool
-from tools.calculator_tool import CalculatorTool
+from crewai.project import CrewBase, after_kickoff, agent, before_kickoff, crew, task
 
 import os
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
+# 工具类（及其依赖的akshare、pandas）在创建Agent时才导入，见 tools/__init__.py
+import tools
+from tools.tool_memo import ToolMemo
+from tools.compact import token_stats
+from tools.source_registry import registry
+from tools.tracing import tracer
+
 # from langchain.llms import Ollama
 # llm = Ollama(model="llama3.1")
 
@@ -21,35 +24,103 @@ base_url = os.getenv("OPENAI_BASE_URL")
 temperature = float(os.getenv("TEMPERATURE", "0.8"))
 max_tokens = int(os.getenv("MAX_TOKENS", "14000"))
 
-from crewai import LLM
-llm = LLM(
-    model=f"openai/{model_name}", # 使用环境变量中的模型名称
-    api_key=api_key,
-    base_url=base_url,
-    temperature=temperature,
-    max_tokens=max_tokens,
-    top_p=0.9,
-    frequency_penalty=0.1,
-    presence_penalty=0.1,
-    stop=["END"],
-    seed=42
-)
+# 任务执行方式：dag（被依赖的独立任务并行执行）或 sequential（逐个执行）
+execution_mode = os.getenv("CREW_EXECUTION_MODE", "dag").lower()
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """第一次创建Agent时才构建LLM，导入本模块不初始化模型客户端和响应缓存"""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            from crewai import LLM
+            from llm_cache import CachedLLM, LLM_CACHE_ENABLED
+
+            llm = LLM(
+                model=f"openai/{model_name}", # 使用环境变量中的模型名称
+                api_key=api_key,
+                base_url=base_url,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=0.9,
+                frequency_penalty=0.1,
+                presence_penalty=0.1,
+                stop=["END"],
+                seed=42
+            )
+
+            # 精确匹配的本地响应缓存，输入不变的重复运行直接返回上次的响应；关闭缓存时仍记录LLM调用追踪
+            _llm = CachedLLM(llm, use_cache=LLM_CACHE_ENABLED)
+    return _llm
+
+
+def _llm_cache():
+    """已构建LLM且开启响应缓存时返回缓存对象"""
+    return getattr(_llm, "cache", None)
 
 @CrewBase
 class AStockAnalysisCrew:
     agents_config = 'config/agents.yaml'
     tasks_config = 'config/tasks.yaml'
 
+    @property
+    def tool_memo(self) -> ToolMemo:
+        """本crew所有Agent共享的工具结果缓存"""
+        if getattr(self, '_tool_memo', None) is None:
+            self._tool_memo = ToolMemo()
+        return self._tool_memo
+
+    @before_kickoff
+    def prefetch_data(self, inputs):
+        """启动前按各任务声明的数据需求并行预取，预热工具缓存"""
+        from tools.prefetch import prefetch
+
+        self.tool_memo.clear()
+        prefetch(self.tasks_config, inputs)
+        return inputs
+
+    @after_kickoff
+    def report_tool_memo(self, output):
+        # LLM缓存、token、耗时和数据源统计只含本次运行（见 kickoff）
+        print(self.tool_memo.summary())
+        cache = _llm_cache()
+        summaries = (cache.summary() if cache else "", token_stats.summary(), tracer.summary(), registry.summary())
+        for summary in summaries:
+            if summary:
+                print(summary)
+        return output
+
+    def kickoff(self, inputs=None):
+        """
+        运行一次分析。追踪、token统计和数据源统计按本次运行的ID记录，批量分析时并发的多个crew互不混淆；
+        kickoff 抛出异常时同样结束本次追踪
+        """
+        run_id = tracer.begin()
+        try:
+            return self.crew().kickoff(inputs=inputs)
+        finally:
+            paths = tracer.end(run_id)
+            token_stats.discard(run_id)
+            registry.discard(run_id)
+            cache = _llm_cache()
+            if cache:
+                cache.discard(run_id)
+            if paths:
+                print(f"追踪已导出：{paths[0]}，{paths[1]}")
+
     @agent
     def a_stock_analyst(self) -> Agent:
         return Agent(
             config=self.agents_config['a_stock_analyst'],
             verbose=True,
-            llm=llm,
+            llm=get_llm(),
             tools=[
-                AStockDataTool(),
-                FinancialAnalysisTool(),
-                CalculatorTool(),
+                tools.AStockDataTool(memo=self.tool_memo),
+                tools.FinancialAnalysisTool(memo=self.tool_memo),
+                tools.CalculatorTool(memo=self.tool_memo),
             ]
         )
 
@@ -65,11 +136,11 @@ class AStockAnalysisCrew:
         return Agent(
             config=self.agents_config['financial_analyst'],
             verbose=True,
-            llm=llm,
+            llm=get_llm(),
             tools=[
-                AStockDataTool(),
-                FinancialAnalysisTool(),
-                CalculatorTool(),
+                tools.AStockDataTool(memo=self.tool_memo),
+                tools.FinancialAnalysisTool(memo=self.tool_memo),
+                tools.CalculatorTool(memo=self.tool_memo),
             ]
         )
 
@@ -85,10 +156,10 @@ class AStockAnalysisCrew:
         return Agent(
             config=self.agents_config['market_sentiment_analyst'],
             verbose=True,
-            llm=llm,
+            llm=get_llm(),
             tools=[
-                AStockDataTool(),
-                MarketSentimentTool(),
+                tools.AStockDataTool(memo=self.tool_memo),
+                tools.MarketSentimentTool(memo=self.tool_memo),
             ]
         )
 
@@ -104,9 +175,9 @@ class AStockAnalysisCrew:
         return Agent(
             config=self.agents_config['investment_advisor'],
             verbose=True,
-            llm=llm,
+            llm=get_llm(),
             tools=[
-                CalculatorTool(),
+                tools.CalculatorTool(memo=self.tool_memo),
             ]
         )
 
@@ -117,9 +188,21 @@ class AStockAnalysisCrew:
             agent=self.investment_advisor(),
         )
 
+    def _mark_parallel_tasks(self) -> None:
+        """
+        DAG模式：被其他任务通过 context 依赖、且自身没有依赖的任务改为异步执行，
+        这些任务同时开始，依赖它们的任务等待全部结果后再执行
+        """
+        depended = {id(dep) for task in self.tasks if isinstance(task.context, list) for dep in task.context}
+        for task in self.tasks:
+            independent = not (isinstance(task.context, list) and task.context)
+            task.async_execution = id(task) in depended and independent
+
     @crew
     def crew(self) -> Crew:
         """创建A股分析团队"""
+        if execution_mode == "dag":
+            self._mark_parallel_tasks()
         return Crew(
             agents=self.agents,
             tasks=self.tasks,
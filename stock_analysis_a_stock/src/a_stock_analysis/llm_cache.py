@@ -0,0 +1,271 @@
+"""
+LLM响应缓存模块
+按 模型、生成参数、完整消息列表 精确匹配缓存LLM的响应（文本或原生工具调用列表），保存在本地SQLite中，
+超出容量时按最近使用时间淘汰；输入不变的重复运行不再请求模型接口
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from crewai.llms.base_llm import BaseLLM
+
+from tools.compact import count_tokens
+from tools.data_cache import CACHE_DIR
+from tools.tracing import current_run_id, tracer
+
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+# 参与缓存键计算的生成参数
+KEY_PARAMS = ("model", "base_url", "temperature", "top_p", "max_tokens", "seed",
+              "frequency_penalty", "presence_penalty", "stop")
+
+
+class ResponseCache:
+    """SQLite响应缓存，多线程、多进程共享同一文件；命中次数按运行ID分别统计"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = int(LLM_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._runs: Dict[Optional[str], Counter] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        finally:
+            conn.close()
+        with self._lock:
+            self._runs.setdefault(current_run_id(), Counter())["misses" if row is None else "hits"] += 1
+        return None if row is None else row[0]
+
+    def set(self, key: str, response: str) -> None:
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response, size, now, now),
+                )
+                self._evict(conn)
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """总大小超出上限时，删除最久未使用的条目直到降至上限的90%"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def clear(self) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM responses")
+        finally:
+            conn.close()
+
+    def discard(self, run_id: Optional[str] = None) -> None:
+        """丢弃某次运行（默认当前运行）的命中统计"""
+        with self._lock:
+            self._runs.pop(run_id or current_run_id(), None)
+
+    def summary(self, run_id: Optional[str] = None) -> str:
+        """某次运行（默认当前运行）的命中次数"""
+        with self._lock:
+            counts = self._runs.get(run_id or current_run_id())
+            if not counts:
+                return ""
+            hits, misses = counts["hits"], counts["misses"]
+        return f"LLM响应缓存：请求 {hits + misses} 次，命中 {hits} 次"
+
+
+# 工具调用列表序列化后的前缀，与文本响应区分（文本响应不会以NUL开头）
+_TOOL_CALLS_PREFIX = "\x00tool_calls:"
+
+
+def _cache_key(llm: Any, messages: Any, tools: Any, response_model: Any) -> str:
+    payload = {name: getattr(llm, name, None) for name in KEY_PARAMS}
+    payload["messages"] = messages
+    payload["tools"] = tools
+    payload["response_model"] = getattr(response_model, "__name__", response_model)
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _prompt_text(messages: Any) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(m.get("content") or "") if isinstance(m, dict) else str(m) for m in messages or [])
+
+
+def _record_usage(record: Any, messages: Any, response: Any) -> None:
+    # token数按提示词与响应文本计算（未安装tiktoken时为估算值）
+    record.set(prompt_tokens=count_tokens(_prompt_text(messages)))
+    if isinstance(response, str):
+        record.set(completion_tokens=count_tokens(response), payload_bytes=len(response.encode("utf-8")))
+
+
+def _tool_call_fields(call: Any) -> Optional[tuple]:
+    """取出工具调用的 (id, 工具名, 参数)，支持OpenAI、Anthropic、Gemini格式的对象和字典；名称保持原样"""
+    if isinstance(call, dict):
+        function = call.get("function") or {}
+        name = function.get("name") or call.get("name")
+        arguments = function.get("arguments") or call.get("arguments") or call.get("input") or {}
+        call_id = call.get("call_id") or call.get("id") or call.get("toolUseId")
+    elif getattr(call, "function", None) is not None:
+        name, arguments, call_id = call.function.name, call.function.arguments, getattr(call, "id", None)
+    elif getattr(call, "function_call", None):
+        name, arguments, call_id = call.function_call.name, dict(call.function_call.args or {}), None
+    elif hasattr(call, "name") and hasattr(call, "input"):
+        name, arguments, call_id = call.name, call.input, getattr(call, "id", None)
+    else:
+        return None
+    return call_id, name, arguments
+
+
+def _encode(response: Any) -> Optional[str]:
+    """
+    响应转为缓存文本：文本原样保存；原生函数调用返回的工具调用列表
+    统一转为OpenAI格式 {"id", "type", "function": {"name", "arguments"}} 后序列化；
+    其他类型（结构化输出对象等）返回 None，不缓存
+    """
+    if isinstance(response, str):
+        return response or None
+    if not isinstance(response, list) or not response:
+        return None
+    calls = []
+    for index, call in enumerate(response):
+        fields = _tool_call_fields(call)
+        if fields is None or not fields[1]:
+            return None
+        call_id, name, arguments = fields
+        call_id = call_id or f"call_{index}"
+        if not isinstance(arguments, str):
+            arguments = json.dumps(arguments, ensure_ascii=False, default=str)
+        calls.append({"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}})
+    return _TOOL_CALLS_PREFIX + json.dumps(calls, ensure_ascii=False)
+
+
+def _decode(cached: str) -> Any:
+    if cached.startswith(_TOOL_CALLS_PREFIX):
+        return json.loads(cached[len(_TOOL_CALLS_PREFIX):])
+    return cached
+
+
+class CachedLLM(BaseLLM):
+    """
+    包装任意crewai LLM的响应缓存层，每次调用记录追踪span。
+    缓存文本响应和原生函数调用返回的工具调用列表（命中时以OpenAI格式的字典列表返回，由Agent照常执行工具）；
+    由LLM直接执行函数调用（available_functions）的请求不缓存，因为其响应是工具的执行结果，缓存会跳过工具执行；
+    结构化输出（response_model）返回的对象不缓存。use_cache=False 时只记录追踪。
+    """
+
+    llm: Any = None
+    cache: Any = None
+
+    def __init__(self, llm: BaseLLM, cache: Optional[ResponseCache] = None, use_cache: bool = True):
+        super().__init__(model=llm.model, temperature=llm.temperature, stop=list(llm.stop or []))
+        self.llm = llm
+        self.cache = (cache or ResponseCache()) if use_cache else None
+
+    def _sync_stop(self) -> None:
+        # Agent会向LLM追加停止词（如 Observation:），需同步给实际发起请求的LLM
+        if list(self.llm.stop or []) != list(self.stop or []):
+            self.llm.stop = list(self.stop or [])
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs) -> Any:
+        self._sync_stop()
+        with tracer.span("llm", self.llm.model) as record:
+            if available_functions or self.cache is None:
+                record.set(cache="bypass")
+                response = self.llm.call(messages, tools=tools, callbacks=callbacks,
+                                         available_functions=available_functions, **kwargs)
+                _record_usage(record, messages, response)
+                return response
+            key = _cache_key(self.llm, messages, tools, kwargs.get("response_model"))
+            cached = self.cache.get(key)
+            if cached is not None:
+                record.set(cache="hit", payload_bytes=len(cached.encode("utf-8")))
+                return _decode(cached)
+            record.set(cache="miss")
+            response = self.llm.call(messages, tools=tools, callbacks=callbacks, **kwargs)
+            _record_usage(record, messages, response)
+            encoded = _encode(response)
+            if encoded is not None:
+                self.cache.set(key, encoded)
+            return response
+
+    async def acall(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs) -> Any:
+        self._sync_stop()
+        with tracer.span("llm", self.llm.model) as record:
+            if available_functions or self.cache is None:
+                record.set(cache="bypass")
+                response = await self.llm.acall(messages, tools=tools, callbacks=callbacks,
+                                                available_functions=available_functions, **kwargs)
+                _record_usage(record, messages, response)
+                return response
+            key = _cache_key(self.llm, messages, tools, kwargs.get("response_model"))
+            cached = self.cache.get(key)
+            if cached is not None:
+                record.set(cache="hit", payload_bytes=len(cached.encode("utf-8")))
+                return _decode(cached)
+            record.set(cache="miss")
+            response = await self.llm.acall(messages, tools=tools, callbacks=callbacks, **kwargs)
+            _record_usage(record, messages, response)
+            encoded = _encode(response)
+            if encoded is not None:
+                self.cache.set(key, encoded)
+            return response
+
+    def supports_function_calling(self) -> bool:
+        return self.llm.supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self.llm.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.llm.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.llm.get_token_usage_summary()
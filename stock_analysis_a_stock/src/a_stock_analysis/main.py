@@ -1,5 +1,19 @@
+import argparse
+import json
+import os
 import sys
-from crew import AStockAnalysisCrew
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# crew（crewai、akshare、pandas）在真正运行分析时才导入，--help 等短命令无需加载
+from tools.tracing import tracer
+
+# 批量分析时同时运行的crew数量
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
 
 def run():
     """
@@ -10,23 +24,119 @@ def run():
         'stock_code': '600519.SH',  # 港股腾讯，可改为A股代码如 '000001.SZ'
         'market': 'SH'  # HK=港股, SZ=深交所, SH=上交所
     }
-    return AStockAnalysisCrew().crew().kickoff(inputs=inputs)
+    from crew import AStockAnalysisCrew
+    return AStockAnalysisCrew().kickoff(inputs=inputs)
+
+def parse_stock(item):
+    """
+    解析股票参数，格式为 "代码[:公司名称]"，如 "600519.SH:贵州茅台"
+    """
+    code, _, name = item.strip().partition(':')
+    code = code.strip().upper()
+    market = code.rsplit('.', 1)[-1] if '.' in code else 'SH'
+    return {
+        'company_name': name.strip() or code,
+        'stock_code': code,
+        'market': market
+    }
+
+def _analyze(inputs):
+    started = time.perf_counter()
+    record = dict(inputs, started_at=datetime.now().isoformat(timespec='seconds'))
+    try:
+        from crew import AStockAnalysisCrew
+        result = AStockAnalysisCrew().kickoff(inputs=inputs)
+        record.update(status='ok', report=str(getattr(result, 'raw', result)))
+    except Exception as e:
+        record.update(status='error', error=str(e))
+    record['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+    return record
+
+def run_batch(stocks, output_path="batch_results.jsonl", concurrency=BATCH_CONCURRENCY):
+    """
+    并发分析多只股票，每只股票一个独立的crew，行情/日线/财务等数据缓存在进程内共享。
+    每完成一只即向 output_path 追加一行JSON，返回全部结果。
+    """
+    tasks = [parse_stock(item) if isinstance(item, str) else item for item in stocks]
+    results = []
+    # 各crew并发执行，整个批次合并为一份追踪；每个crew在自己的线程中开始独立的运行ID，各自汇总
+    batch_run = tracer.begin()
+    try:
+        with open(output_path, 'a', encoding='utf-8') as output, \
+                ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = [executor.submit(_analyze, inputs) for inputs in tasks]
+            for future in as_completed(futures):
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                output.flush()
+                results.append(record)
+                print(f"[{len(results)}/{len(tasks)}] {record['stock_code']} {record['status']}（{record['elapsed_seconds']}秒）")
+    finally:
+        paths = tracer.end(batch_run)
+    if paths:
+        print(f"批次追踪已导出：{paths[0]}，{paths[1]}")
+    return results
 
-def train():
+def batch(stocks=None, file=None):
     """
-    训练crew
+    批量分析入口：python main.py batch 600519.SH:贵州茅台 000001.SZ:平安银行
+    或从文件读取股票列表（每行一只）：python main.py batch --file stocks.txt
     """
+    if stocks is None and file is None:
+        args = sys.argv[2:] if len(sys.argv) > 1 and sys.argv[1] == 'batch' else sys.argv[1:]
+        if args[:1] == ['--file']:
+            file = args[1]
+        else:
+            stocks = args
+    if file:
+        with open(file, 'r', encoding='utf-8') as f:
+            stocks = [line for line in f if line.strip() and not line.startswith('#')]
+    output_path = os.getenv("BATCH_OUTPUT", "batch_results.jsonl")
+    results = run_batch(stocks, output_path=output_path)
+    failed = sum(1 for r in results if r['status'] != 'ok')
+    print(f"完成 {len(results)} 只股票，失败 {failed} 只，结果已写入 {output_path}")
+    return results
+
+def train(n_iterations=None):
+    """
+    训练crew：train <迭代次数>
+    """
+    if n_iterations is None:
+        # 先校验参数再导入crew，参数错误时立即退出
+        try:
+            n_iterations = int(sys.argv[1])
+        except (IndexError, ValueError):
+            sys.exit("用法：train <迭代次数>")
     inputs = {
         'company_name': '贵州茅台',
         'stock_code': '600519.SH',
         'market': 'SH'
     }
+    from crew import AStockAnalysisCrew
     try:
-        AStockAnalysisCrew().crew().train(n_iterations=int(sys.argv[1]), inputs=inputs)
+        AStockAnalysisCrew().crew().train(n_iterations=n_iterations, inputs=inputs)
     except Exception as e:
         raise Exception(f"训练crew时发生错误: {e}")
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="A股智能分析系统")
+    commands = parser.add_subparsers(dest="command", metavar="{run,batch,train}")
+    commands.add_parser("run", help="分析默认股票（不指定命令时执行）")
+    batch_parser = commands.add_parser("batch", help="批量分析多只股票")
+    batch_parser.add_argument("stocks", nargs="*", help="股票，格式为 代码[:公司名称]，如 600519.SH:贵州茅台")
+    batch_parser.add_argument("--file", help="股票列表文件，每行一只")
+    train_parser = commands.add_parser("train", help="训练crew")
+    train_parser.add_argument("n_iterations", type=int, help="迭代次数")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'batch':
+        batch(args.stocks, args.file)
+        sys.exit(0)
+    if args.command == 'train':
+        train(args.n_iterations)
+        sys.exit(0)
     print("## 欢迎使用A股智能分析系统")
     print('-------------------------------')
     result = run()
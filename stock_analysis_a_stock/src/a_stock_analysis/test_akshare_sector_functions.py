@@ -1,4 +1,4 @@
-import akshare as ak
+from tools.datasource import ak
 
 # 测试板块相关函数
 try:
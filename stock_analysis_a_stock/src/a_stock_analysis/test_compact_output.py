@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试工具的紧凑输出格式：时间戳不被改写、条目保持原有顺序、紧凑格式的token数少于文本格式。
+数据源替换为本地构造的数据，无需联网
+"""
+
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tools import a_stock_data_tool, market_sentiment_tool
+from tools.compact import Report, count_tokens, format_output
+
+
+DAILY = pd.DataFrame({
+    '日期': [f"2024-06-{d:02d}" for d in range(1, 31)],
+    '开盘': np.linspace(1600, 1690, 30),
+    '最高': np.linspace(1610, 1700, 30),
+    '最低': np.linspace(1590, 1680, 30),
+    '收盘': np.linspace(1605, 1695, 30),
+    '涨跌幅': np.linspace(-1.5, 2.5, 30),
+    '成交量': np.arange(30) * 1000 + 25000,
+})
+
+NEWS = {
+    'stock_news_em': pd.DataFrame({'标题': ['央行开展逆回购操作', '白酒板块午后拉升'],
+                                   '发布时间': ['2024-06-28 10:30:00', '2024-06-28 13:05:12']}),
+    'stock_news_jrj': pd.DataFrame({'标题': ['监管层发布上市公司分红新规', '市场早评']}),
+}
+
+
+class _Snapshot:
+    df = pd.DataFrame({'涨跌幅': np.linspace(-5, 5, 101), '成交量': np.arange(101) * 1000})
+
+
+class _Results:
+    def __init__(self, fetchers):
+        self._fetchers = fetchers
+
+    def get(self, name):
+        return self._fetchers[name]()
+
+
+def _use_local_data():
+    """工具模块中的数据请求改为直接返回本地数据"""
+    for module in (a_stock_data_tool, market_sentiment_tool):
+        module.fetch = lambda func, *args, **kwargs: func()
+        module.get_daily_history = lambda code, days=30, **kwargs: DAILY.tail(days).reset_index(drop=True)
+        module.get_market_table = lambda name: NEWS[name]
+        module.get_spot_snapshot = lambda source: _Snapshot()
+    market_sentiment_tool.run_parallel = lambda fetchers, **kwargs: _Results(fetchers)
+
+
+def test_timestamps_kept():
+    """值中的时间（含冒号）原样保留"""
+    print("\n=== 测试时间戳 ===")
+    result = market_sentiment_tool.MarketSentimentTool()._run(
+        stock_code="600519.SH", sentiment_type="news", output_format="compact")
+    print(result)
+    assert "央行开展逆回购操作 (2024-06-28 10:30:00)" in result
+    assert "白酒板块午后拉升 (2024-06-28 13:05:12)" in result
+    assert "10=30" not in result and "13=05" not in result
+
+
+def test_order_kept():
+    """小标题下的列表项紧跟小标题，章节顺序与文本报告一致"""
+    print("\n=== 测试条目顺序 ===")
+    report = Report("测试报告")
+    report.section("市场热点追踪")
+    report.note("今日市场热点：\n")
+    report.note("  • 热点一 (09:31)\n")
+    report.field("市场广度", "0.55")
+    report.section("风险提示")
+    report.note("• 注意市场整体情绪波动风险\n")
+    lines = format_output("测试工具", report, "compact").splitlines()
+    print("\n".join(lines))
+    assert lines[:7] == ["title=测试报告", "[市场热点追踪]", "今日市场热点：", "热点一 (09:31)",
+                         "市场广度=0.55", "[风险提示]", "注意市场整体情绪波动风险"]
+
+    result = market_sentiment_tool.MarketSentimentTool()._run(
+        stock_code="600519.SH", sentiment_type="news", output_format="compact").splitlines()
+    assert result.index("今日市场热点：") < result.index("央行开展逆回购操作 (2024-06-28 10:30:00)")
+    assert result.index("[市场热点追踪]") < result.index("[政策消息影响]") < result.index("[风险提示]")
+
+
+def test_token_saving():
+    """实际工具输出的紧凑格式比文本格式少用token，文本格式不受影响"""
+    print("\n=== 测试token节省 ===")
+    for tool, kwargs in ((a_stock_data_tool.AStockDataTool(), {"data_type": "daily"}),
+                         (market_sentiment_tool.MarketSentimentTool(), {"sentiment_type": "news"})):
+        text = tool._run(stock_code="600519.SH", output_format="text", **kwargs)
+        compact = tool._run(stock_code="600519.SH", output_format="compact", **kwargs)
+        body, counts = compact.rsplit("\n", 1)
+        print(f"{tool.name} {kwargs}：{counts}")
+        assert count_tokens(body) < count_tokens(text)
+        assert counts == f"tokens={count_tokens(text)}→{count_tokens(body)}"
+        assert "tokens=" not in text
+
+
+def main():
+    """主函数"""
+    _use_local_data()
+    test_timestamps_kept()
+    test_order_kept()
+    test_token_saving()
+    print("\n测试完成!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import akshare as ak
+from tools.datasource import ak
 import pandas as pd
 import traceback
 
@@ -7,7 +7,7 @@
 import sys
 import os
 import pandas as pd
-import akshare as ak
+from tools.datasource import ak
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
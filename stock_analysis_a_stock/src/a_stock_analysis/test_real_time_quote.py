@@ -4,7 +4,7 @@
 测试实时行情数据获取功能
 """
 
-import akshare as ak
+from tools.datasource import ak
 import pandas as pd
 
 
@@ -1,16 +1,33 @@
 """
 A股分析工具模块
 包含基于AKShare的各种数据获取和分析工具
+工具类在首次访问时才导入（PEP 562），只用到追踪、缓存等轻量模块时不加载crewai、akshare和pandas
 """
 
-from .a_stock_data_tool import AStockDataTool
-from .financial_tool import FinancialAnalysisTool
-from .market_sentiment_tool import MarketSentimentTool
-from .calculator_tool import CalculatorTool
+import importlib
+
+_TOOLS = {
+    'AStockDataTool': '.a_stock_data_tool',
+    'FinancialAnalysisTool': '.financial_tool',
+    'MarketSentimentTool': '.market_sentiment_tool',
+    'CalculatorTool': '.calculator_tool',
+}
 
 __all__ = [
     'AStockDataTool',
     'FinancialAnalysisTool',
     'MarketSentimentTool',
     'CalculatorTool'
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _TOOLS:
+        value = getattr(importlib.import_module(_TOOLS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
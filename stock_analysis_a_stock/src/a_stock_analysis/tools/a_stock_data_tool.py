@@ -1,39 +1,65 @@
 from crewai.tools import BaseTool
 from typing import Any, Optional, Type
 from pydantic import BaseModel, Field
-import akshare as ak
 import pandas as pd
 from datetime import datetime, timedelta
 
+from .compact import Report, format_output
+from .concurrency import SOURCE_TIMEOUT, TOOL_DEADLINE_SECONDS, fetch, hedged, with_deadline
+from .data_cache import get_market_table, get_spot_snapshot
+from .datasource import ak
+from .financial_cache import get_financial_indicator
+from .ohlcv_store import get_daily_history
+from .source_registry import registry
+from .tool_memo import ToolError, mark_incomplete, memoized
+from .tracing import traced
+
+
+# 实时行情与板块数据的候选数据源，调用时按可用性与近期p95耗时排序
+A_SPOT_SOURCES = ('stock_zh_a_spot', 'stock_zh_a_spot_em')
+HK_SPOT_SOURCES = ('stock_hk_spot', 'stock_hk_spot_em')
+SECTOR_SOURCES = ('stock_sector_spot', 'stock_board_industry_name_ths')
+
 
 class AStockDataToolSchema(BaseModel):
     """股票数据工具输入参数"""
-    stock_code: str = Field(..., description="股票代码，如：000001.SZ（深交所）、600519.SH（上交所）或00700.HK（港股）")
-    data_type: str = Field(..., description="数据类型：quote（实时行情）、daily（日线数据）、financial（财务数据）、sector（板块数据）")
+    stock_code: str = Field(..., description="股票代码，如：000001.SZ（深交所）、600519.SH（上交所）或00700.HK（港股）；batch模式下可用逗号分隔多个代码")
+    data_type: str = Field(..., description="数据类型：quote（实时行情）、batch（批量行情）、daily（日线数据）、financial（财务数据）、sector（板块数据）")
+    output_format: str = Field("", description="输出格式：text（完整文本）或 compact（紧凑键值文本，节省上下文）；留空时使用默认格式")
 
 
 class AStockDataTool(BaseTool):
     name: str = "股票数据获取工具"
-    description: str = "获取A股和港股的实时行情、历史数据、财务信息等，支持上交所、深交所和港股"
+    description: str = "获取A股和港股的实时行情（支持多只股票批量查询）、历史数据、财务信息等，支持上交所、深交所和港股"
     args_schema: Type[BaseModel] = AStockDataToolSchema
-
-    def _run(self, stock_code: str, data_type: str = "quote", **kwargs) -> Any:
+    # 同一crew内共享的工具结果缓存（ToolMemo），为空时不缓存
+    memo: Any = Field(default=None, exclude=True)
+    # 单次调用的总时限（秒），调用时可用 deadline 参数覆盖
+    deadline_seconds: float = Field(default=TOOL_DEADLINE_SECONDS, exclude=True)
+
+    @traced("tool")
+    @with_deadline
+    @memoized
+    def _run(self, stock_code: str, data_type: str = "quote", output_format: str = "", **kwargs) -> Any:
         """获取A股数据"""
         try:
             if data_type == "quote":
-                return self._get_real_time_quote(stock_code)
+                result = self._get_real_time_quote(stock_code)
+            elif data_type == "batch":
+                result = self._get_batch_quotes(stock_code)
             elif data_type == "daily":
-                return self._get_daily_data(stock_code)
+                result = self._get_daily_data(stock_code)
             elif data_type == "financial":
-                return self._get_financial_data(stock_code)
+                result = self._get_financial_data(stock_code)
             elif data_type == "sector":
-                return self._get_sector_data()
+                result = self._get_sector_data()
             else:
                 raise ValueError(f"不支持的数据类型: {data_type}")
+            return format_output(self.name, result, output_format)
         except Exception as e:
-            return f"获取数据时发生错误: {str(e)}"
+            return ToolError(f"获取数据时发生错误: {str(e)}")
 
-    def _get_real_time_quote(self, stock_code: str) -> str:
+    def _get_real_time_quote(self, stock_code: str) -> Any:
         """获取实时行情数据"""
         try:
             # 判断是否为港股
@@ -41,71 +67,50 @@ class AStockDataTool(BaseTool):
                 return self._get_hk_real_time_quote(stock_code)
             
             # 提取A股股票代码部分，处理不同格式
-            if stock_code.endswith('.SZ') or stock_code.endswith('.SH'):
-                code = stock_code.split('.')[0]
-            elif len(stock_code) > 2 and (stock_code[:2] == 'sz' or stock_code[:2] == 'sh' or 
-                                         stock_code[:2] == 'SZ' or stock_code[:2] == 'SH'):
-                # 处理sh600519或sz000001格式
-                code = stock_code[2:]
-            else:
-                # 直接使用传入的代码
-                code = stock_code
+            code = self._extract_a_share_code(stock_code)
 
-            # 获取A股实时行情数据，尝试多个数据源
-            # 1. 首先尝试主数据源
-            try:
-                df = ak.stock_zh_a_spot()
-                # 尝试精确匹配代码
-                stock_data = df[df['代码'] == code]
-                
-                # 如果主数据源失败，尝试备用数据源
-                if stock_data.empty:
-                    df = ak.stock_zh_a_spot_em()
-                    stock_data = df[df['代码'] == code]
-            except Exception as e:
-                # 如果主数据源出错，直接尝试备用数据源
-                df = ak.stock_zh_a_spot_em()
-                stock_data = df[df['代码'] == code]
+            # 获取A股实时行情数据：主数据源慢、出错或查不到该代码时对冲请求备用数据源，
+            # 通过快照的代码索引精确匹配，取先得到的结果
+            row = hedged([lambda source=source: get_spot_snapshot(source).lookup(code)
+                          for source in registry.rank(A_SPOT_SOURCES)], timeout=SOURCE_TIMEOUT)
 
-            if stock_data.empty:
+            if row is None:
                 # 提供更详细的错误信息
                 return f"未找到股票 {stock_code} 的实时数据。请检查代码格式或尝试使用其他数据源。"
-
-            # 提取主要信息
-            row = stock_data.iloc[0]
             
-            # 安全地构建结果字符串，检查每个字段是否存在
-            result = f"股票：{row.get('名称', '未知')} ({stock_code})\n"
+            # 安全地构建结果，检查每个字段是否存在
+            result = Report(f"{row.get('名称', '未知')} ({stock_code})",
+                            text=f"股票：{row.get('名称', '未知')} ({stock_code})\n")
             
             if '最新价' in row:
                 try:
-                    result += f"当前价格：{float(row['最新价']):.2f}\n"
+                    result.field("当前价格", f"{float(row['最新价']):.2f}")
                 except (ValueError, TypeError):
-                    result += f"当前价格：{row['最新价']}\n"
+                    result.field("当前价格", row['最新价'])
             
             if '涨跌幅' in row:
                 try:
-                    result += f"涨跌幅：{float(row['涨跌幅']):.2f}%\n"
+                    result.field("涨跌幅", f"{float(row['涨跌幅']):.2f}%")
                 except (ValueError, TypeError):
-                    result += f"涨跌幅：{row['涨跌幅']}\n"
+                    result.field("涨跌幅", row['涨跌幅'])
             
             if '涨跌额' in row:
                 try:
-                    result += f"涨跌额：{float(row['涨跌额']):.2f}\n"
+                    result.field("涨跌额", f"{float(row['涨跌额']):.2f}")
                 except (ValueError, TypeError):
-                    result += f"涨跌额：{row['涨跌额']}\n"
+                    result.field("涨跌额", row['涨跌额'])
             
             if '成交量' in row:
                 try:
-                    result += f"成交量：{int(row['成交量']):,}\n"
+                    result.field("成交量", int(row['成交量']), text=f"成交量：{int(row['成交量']):,}\n")
                 except (ValueError, TypeError):
-                    result += f"成交量：{row['成交量']}\n"
+                    result.field("成交量", row['成交量'])
             
             if '成交额' in row:
                 try:
-                    result += f"成交额：{int(row['成交额']):,}\n"
+                    result.field("成交额", int(row['成交额']), text=f"成交额：{int(row['成交额']):,}\n")
                 except (ValueError, TypeError):
-                    result += f"成交额：{row['成交额']}\n"
+                    result.field("成交额", row['成交额'])
             
             # 添加其他重要字段
             important_fields = ['最高', '最低', '今开', '昨收', '市盈率-动态', '市净率', '总市值', '流通市值']
@@ -116,58 +121,154 @@ class AStockDataTool(BaseTool):
                 if field in row:
                     try:
                         if field in ['最高', '最低', '今开', '昨收']:
-                            result += f"{field_names[field]}：{float(row[field]):.2f}\n"
+                            result.field(field_names[field], f"{float(row[field]):.2f}")
                         elif field in ['市盈率-动态', '市净率']:
-                            result += f"{field_names[field]}：{float(row[field]):.2f}\n"
+                            result.field(field_names[field], f"{float(row[field]):.2f}")
                         elif field in ['总市值', '流通市值']:
-                            result += f"{field_names[field]}：{int(row[field]):,}\n"
+                            result.field(field_names[field], int(row[field]),
+                                         text=f"{field_names[field]}：{int(row[field]):,}\n")
                     except (ValueError, TypeError):
-                        result += f"{field_names[field]}：{row[field]}\n"
+                        result.field(field_names[field], row[field])
 
             return result
 
         except Exception as e:
-            return f"获取实时行情失败: {str(e)}"
+            return ToolError(f"获取实时行情失败: {str(e)}")
+
+    @staticmethod
+    def _extract_a_share_code(stock_code: str) -> str:
+        """提取A股纯数字代码，兼容600519.SH、sh600519和600519等格式"""
+        if stock_code.endswith('.SZ') or stock_code.endswith('.SH'):
+            return stock_code.split('.')[0]
+        if len(stock_code) > 2 and stock_code[:2] in ('sz', 'sh', 'SZ', 'SH'):
+            # 处理sh600519或sz000001格式
+            return stock_code[2:]
+        # 直接使用传入的代码
+        return stock_code
+
+    def _get_batch_quotes(self, stock_codes: str) -> Any:
+        """批量获取A股和港股实时行情，所有代码共用同一份全市场快照"""
+        try:
+            codes = [c.strip() for c in stock_codes.replace('，', ',').replace(' ', ',').split(',') if c.strip()]
+            if not codes:
+                return "请提供至少一个股票代码"
+
+            rows = {}
+            timed_out = []
+            pending = {'A': [], 'HK': []}
+            for stock_code in dict.fromkeys(codes):
+                if stock_code.endswith('.HK'):
+                    pending['HK'].append((stock_code, stock_code.replace('.HK', '')))
+                else:
+                    pending['A'].append((stock_code, self._extract_a_share_code(stock_code)))
+
+            # 主数据源未命中的代码再到备用数据源中查找
+            sources = {'A': A_SPOT_SOURCES, 'HK': HK_SPOT_SOURCES}
+            for market, items in pending.items():
+                if not items:
+                    continue
+                # 主备数据源（按可用性与近期耗时排序）对冲请求，先用先返回的快照匹配，其余代码再查另一个数据源
+                primary, backup = registry.rank(sources[market])
+                try:
+                    first = hedged([lambda: get_spot_snapshot(primary), lambda: get_spot_snapshot(backup)],
+                                   accept=lambda snapshot: not snapshot.empty, timeout=SOURCE_TIMEOUT)
+                    order = (first.source, backup if first.source == primary else primary)
+                except TimeoutError:
+                    timed_out.append(market)
+                    order = ()
+                except Exception:
+                    mark_incomplete()
+                    order = ()
+                for source in order:
+                    if not items:
+                        break
+                    try:
+                        snapshot = fetch(lambda source=source: get_spot_snapshot(source))
+                    except TimeoutError:
+                        break
+                    except Exception:
+                        mark_incomplete()
+                        continue
+                    missing = []
+                    for stock_code, code in items:
+                        row = snapshot.lookup(code)
+                        if row is None:
+                            missing.append((stock_code, code))
+                        else:
+                            rows[stock_code] = row
+                    items = missing
+
+            result = Report(f"批量行情（共{len(codes)}只，找到{len(rows)}只）")
+            result.columns(['代码', '名称', '最新价', '涨跌幅', '成交额', '市盈率', '市净率'],
+                           text=f"{'代码':<11} {'名称':<10} {'最新价':>10} {'涨跌幅':>8} {'成交额':>16} {'市盈率':>8} {'市净率':>7}\n")
+            not_found = []
+            for stock_code in dict.fromkeys(codes):
+                row = rows.get(stock_code)
+                if row is None:
+                    not_found.append(stock_code)
+                    continue
+                price = self._first_number(row, ['最新价', '现价', '价格'])
+                change = self._first_number(row, ['涨跌幅', '涨跌%', '涨跌幅度'])
+                amount = self._first_number(row, ['成交额', '成交金额', '金额'])
+                pe = self._first_number(row, ['市盈率-动态', '市盈率'])
+                pb = self._first_number(row, ['市净率'])
+                result.row([stock_code, row.get('名称', '未知'), self._fmt(price, '.2f'), self._fmt(change, '+.2f', '%'),
+                            self._fmt(amount, '.0f'), self._fmt(pe, '.2f'), self._fmt(pb, '.2f')],
+                           text=f"{stock_code:<11} {str(row.get('名称', '未知')):<10} "
+                                f"{self._fmt(price, '.2f'):>10} {self._fmt(change, '+.2f', '%'):>8} "
+                                f"{self._fmt(amount, ',.0f'):>16} {self._fmt(pe, '.2f'):>8} {self._fmt(pb, '.2f'):>7}\n")
+
+            if not_found:
+                result.field("未找到", ', '.join(not_found))
+            if timed_out:
+                result.field("行情数据获取超时", '、'.join('A股' if m == 'A' else '港股' for m in timed_out))
+
+            return result
 
-    def _get_hk_real_time_quote(self, stock_code: str) -> str:
+        except Exception as e:
+            return ToolError(f"批量获取实时行情失败: {str(e)}")
+
+    @staticmethod
+    def _first_number(row, fields) -> Optional[float]:
+        """按顺序返回第一个可转换为数值的字段值"""
+        for field in fields:
+            if field in row and pd.notna(row[field]):
+                try:
+                    return float(row[field])
+                except (ValueError, TypeError):
+                    continue
+        return None
+
+    @staticmethod
+    def _fmt(value: Optional[float], spec: str, suffix: str = "") -> str:
+        return "--" if value is None else f"{value:{spec}}{suffix}"
+
+    def _get_hk_real_time_quote(self, stock_code: str) -> Any:
         """获取港股实时行情数据"""
         try:
             # 提取港股代码，去掉.HK后缀
             code = stock_code.replace('.HK', '')
             
-            # 获取港股实时行情数据
-            try:
-                df = ak.stock_hk_spot()
-                # 尝试精确匹配代码
-                stock_data = df[df['代码'] == code]
-                
-                # 如果主数据源失败，尝试备用数据源
-                if stock_data.empty:
-                    df = ak.stock_hk_spot_em()
-                    stock_data = df[df['代码'] == code]
-            except Exception as e:
-                # 如果主数据源出错，直接尝试备用数据源
-                df = ak.stock_hk_spot_em()
-                stock_data = df[df['代码'] == code]
+            # 获取港股实时行情数据，主备数据源对冲请求
+            row = hedged([lambda source=source: get_spot_snapshot(source).lookup(code)
+                          for source in registry.rank(HK_SPOT_SOURCES)], timeout=SOURCE_TIMEOUT)
 
-            if stock_data.empty:
+            if row is None:
                 return f"未找到港股 {stock_code} 的实时数据。请检查代码格式。"
-
-            # 提取主要信息
-            row = stock_data.iloc[0]
             
-            # 安全地构建结果字符串，检查每个字段是否存在
-            result = f"港股：{row.get('名称', '未知')} ({stock_code})\n"
+            # 安全地构建结果，检查每个字段是否存在
+            result = Report(f"{row.get('名称', '未知')} ({stock_code})",
+                            text=f"港股：{row.get('名称', '未知')} ({stock_code})\n")
             
             # 港股字段可能不同，需要适配
             price_fields = ['最新价', '现价', '价格']
             for field in price_fields:
                 if field in row and pd.notna(row[field]):
                     try:
-                        result += f"当前价格：{float(row[field]):.2f}港币\n"
+                        result.field("当前价格", f"{float(row[field]):.2f}港币")
                         break
                     except (ValueError, TypeError):
-                        result += f"当前价格：{row[field]}港币\n"
+                        result.field("当前价格", f"{row[field]}港币")
                         break
             
             # 涨跌幅
@@ -175,10 +276,10 @@ class AStockDataTool(BaseTool):
             for field in change_fields:
                 if field in row and pd.notna(row[field]):
                     try:
-                        result += f"涨跌幅：{float(row[field]):.2f}%\n"
+                        result.field("涨跌幅", f"{float(row[field]):.2f}%")
                         break
                     except (ValueError, TypeError):
-                        result += f"涨跌幅：{row[field]}\n"
+                        result.field("涨跌幅", row[field])
                         break
             
             # 涨跌额
@@ -186,10 +287,10 @@ class AStockDataTool(BaseTool):
             for field in change_amount_fields:
                 if field in row and pd.notna(row[field]):
                     try:
-                        result += f"涨跌额：{float(row[field]):.2f}港币\n"
+                        result.field("涨跌额", f"{float(row[field]):.2f}港币")
                         break
                     except (ValueError, TypeError):
-                        result += f"涨跌额：{row[field]}港币\n"
+                        result.field("涨跌额", f"{row[field]}港币")
                         break
             
             # 成交量
@@ -197,10 +298,10 @@ class AStockDataTool(BaseTool):
             for field in volume_fields:
                 if field in row and pd.notna(row[field]):
                     try:
-                        result += f"成交量：{int(row[field]):,}股\n"
+                        result.field("成交量", f"{int(row[field])}股", text=f"成交量：{int(row[field]):,}股\n")
                         break
                     except (ValueError, TypeError):
-                        result += f"成交量：{row[field]}\n"
+                        result.field("成交量", row[field])
                         break
             
             # 成交额
@@ -208,10 +309,10 @@ class AStockDataTool(BaseTool):
             for field in amount_fields:
                 if field in row and pd.notna(row[field]):
                     try:
-                        result += f"成交额：{int(row[field]):,}港币\n"
+                        result.field("成交额", f"{int(row[field])}港币", text=f"成交额：{int(row[field]):,}港币\n")
                         break
                     except (ValueError, TypeError):
-                        result += f"成交额：{row[field]}港币\n"
+                        result.field("成交额", f"{row[field]}港币")
                         break
             
             # 添加其他重要字段
@@ -223,20 +324,21 @@ class AStockDataTool(BaseTool):
                 if field in row and pd.notna(row[field]):
                     try:
                         if field in ['最高', '最低', '今开', '昨收']:
-                            result += f"{field_names[field]}：{float(row[field]):.2f}港币\n"
+                            result.field(field_names[field], f"{float(row[field]):.2f}港币")
                         elif field in ['市盈率', '市净率']:
-                            result += f"{field_names[field]}：{float(row[field]):.2f}\n"
+                            result.field(field_names[field], f"{float(row[field]):.2f}")
                         elif field in ['总市值']:
-                            result += f"{field_names[field]}：{int(row[field]):,}港币\n"
+                            result.field(field_names[field], f"{int(row[field])}港币",
+                                         text=f"{field_names[field]}：{int(row[field]):,}港币\n")
                     except (ValueError, TypeError):
-                        result += f"{field_names[field]}：{row[field]}\n"
+                        result.field(field_names[field], row[field])
 
             return result
 
         except Exception as e:
-            return f"获取港股实时行情失败: {str(e)}"
+            return ToolError(f"获取港股实时行情失败: {str(e)}")
 
-    def _get_daily_data(self, stock_code: str, period: str = "daily") -> str:
+    def _get_daily_data(self, stock_code: str, period: str = "daily") -> Any:
         """获取历史K线数据"""
         try:
             # 判断是否为港股
@@ -253,13 +355,8 @@ class AStockDataTool(BaseTool):
 
             code = stock_code.split('.')[0]
 
-            # 获取历史数据（最近30天）
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
-
-            df = ak.stock_zh_a_hist(symbol=code, period="daily",
-                                   start_date=start_date, end_date=end_date,
-                                   adjust="qfq")
+            # 获取历史数据（最近30天），由本地日线存储增量补齐
+            df = fetch(lambda: get_daily_history(code, days=30, adjust="qfq", market="a"))
 
             if df.empty:
                 return f"未找到股票 {stock_code} 的历史数据"
@@ -272,53 +369,47 @@ class AStockDataTool(BaseTool):
             # 获取最近的数据
             recent_data = df.tail(10)
 
-            result = f"""
-股票 {stock_code} 最近10个交易日数据：
-{'日期':<12} {'开盘':<8} {'最高':<8} {'最低':<8} {'收盘':<8} {'涨跌幅':<8} {'成交量':<12}
-{'-'*80}
-"""
+            result = Report(f"股票 {stock_code} 最近10个交易日数据", text=f"\n股票 {stock_code} 最近10个交易日数据：\n")
+            result.columns(['日期', '开盘', '最高', '最低', '收盘', '涨跌幅', '成交量'],
+                           text=f"{'日期':<12} {'开盘':<8} {'最高':<8} {'最低':<8} {'收盘':<8} {'涨跌幅':<8} {'成交量':<12}\n{'-'*80}\n")
 
             for _, row in recent_data.iterrows():
-                result += f"{row['日期']:<12} {row['开盘']:<8.2f} {row['最高']:<8.2f} {row['最低']:<8.2f} {row['收盘']:<8.2f} {row['涨跌幅']:<8.2f}% {row['成交量']:<12,}\n"
+                result.row([row['日期'], f"{row['开盘']:.2f}", f"{row['最高']:.2f}", f"{row['最低']:.2f}",
+                            f"{row['收盘']:.2f}", f"{row['涨跌幅']:.2f}%", row['成交量']],
+                           text=f"{row['日期']:<12} {row['开盘']:<8.2f} {row['最高']:<8.2f} {row['最低']:<8.2f} {row['收盘']:<8.2f} {row['涨跌幅']:<8.2f}% {row['成交量']:<12,}\n")
 
             # 技术分析
             latest = df.iloc[-1]
             prev_ma5 = df.iloc[-6]['MA5'] if len(df) > 5 else None
             current_ma5 = df.iloc[-1]['MA5']
 
-            result += f"\n技术分析：\n"
-            result += f"当前价格：{latest['收盘']:.2f}\n"
-            result += f"MA5：{current_ma5:.2f}\n"
-            result += f"MA10：{df.iloc[-1]['MA10']:.2f}\n"
-            result += f"MA20：{df.iloc[-1]['MA20']:.2f}\n"
+            result.section("技术分析", text="\n技术分析：\n")
+            result.field("当前价格", f"{latest['收盘']:.2f}")
+            result.field("MA5", f"{current_ma5:.2f}")
+            result.field("MA10", f"{df.iloc[-1]['MA10']:.2f}")
+            result.field("MA20", f"{df.iloc[-1]['MA20']:.2f}")
 
             if prev_ma5 and current_ma5:
                 if latest['收盘'] > current_ma5 > prev_ma5:
-                    result += "趋势：短期上升趋势\n"
+                    result.field("趋势", "短期上升趋势")
                 elif latest['收盘'] < current_ma5 < prev_ma5:
-                    result += "趋势：短期下降趋势\n"
+                    result.field("趋势", "短期下降趋势")
                 else:
-                    result += "趋势：震荡整理\n"
+                    result.field("趋势", "震荡整理")
 
             return result
 
         except Exception as e:
-            return f"获取历史数据失败: {str(e)}"
+            return ToolError(f"获取历史数据失败: {str(e)}")
 
-    def _get_hk_daily_data(self, stock_code: str) -> str:
+    def _get_hk_daily_data(self, stock_code: str) -> Any:
         """获取港股历史K线数据"""
         try:
             # 提取港股代码，去掉.HK后缀
             code = stock_code.replace('.HK', '')
             
-            # 获取历史数据（最近30天）
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
-
-            # 使用港股历史数据函数
-            df = ak.stock_hk_hist(symbol=code, period="daily",
-                                 start_date=start_date, end_date=end_date,
-                                 adjust="qfq")
+            # 获取历史数据（最近30天），由本地日线存储增量补齐
+            df = fetch(lambda: get_daily_history(code, days=30, adjust="qfq", market="hk"))
 
             if df.empty:
                 return f"未找到港股 {stock_code} 的历史数据"
@@ -331,40 +422,40 @@ class AStockDataTool(BaseTool):
             # 获取最近的数据
             recent_data = df.tail(10)
 
-            result = f"""
-港股 {stock_code} 最近10个交易日数据：
-{'日期':<12} {'开盘':<8} {'最高':<8} {'最低':<8} {'收盘':<8} {'涨跌幅':<8} {'成交量':<12}
-{'-'*80}
-"""
+            result = Report(f"港股 {stock_code} 最近10个交易日数据", text=f"\n港股 {stock_code} 最近10个交易日数据：\n")
+            result.columns(['日期', '开盘', '最高', '最低', '收盘', '涨跌幅', '成交量'],
+                           text=f"{'日期':<12} {'开盘':<8} {'最高':<8} {'最低':<8} {'收盘':<8} {'涨跌幅':<8} {'成交量':<12}\n{'-'*80}\n")
 
             for _, row in recent_data.iterrows():
-                result += f"{row['日期']:<12} {row['开盘']:<8.2f} {row['最高']:<8.2f} {row['最低']:<8.2f} {row['收盘']:<8.2f} {row['涨跌幅']:<8.2f}% {row['成交量']:<12,}\n"
+                result.row([row['日期'], f"{row['开盘']:.2f}", f"{row['最高']:.2f}", f"{row['最低']:.2f}",
+                            f"{row['收盘']:.2f}", f"{row['涨跌幅']:.2f}%", row['成交量']],
+                           text=f"{row['日期']:<12} {row['开盘']:<8.2f} {row['最高']:<8.2f} {row['最低']:<8.2f} {row['收盘']:<8.2f} {row['涨跌幅']:<8.2f}% {row['成交量']:<12,}\n")
 
             # 技术分析
             latest = df.iloc[-1]
             prev_ma5 = df.iloc[-6]['MA5'] if len(df) > 5 else None
             current_ma5 = df.iloc[-1]['MA5']
 
-            result += f"\n技术分析：\n"
-            result += f"当前价格：{latest['收盘']:.2f}港币\n"
-            result += f"MA5：{current_ma5:.2f}港币\n"
-            result += f"MA10：{df.iloc[-1]['MA10']:.2f}港币\n"
-            result += f"MA20：{df.iloc[-1]['MA20']:.2f}港币\n"
+            result.section("技术分析", text="\n技术分析：\n")
+            result.field("当前价格", f"{latest['收盘']:.2f}港币")
+            result.field("MA5", f"{current_ma5:.2f}港币")
+            result.field("MA10", f"{df.iloc[-1]['MA10']:.2f}港币")
+            result.field("MA20", f"{df.iloc[-1]['MA20']:.2f}港币")
 
             if prev_ma5 and current_ma5:
                 if latest['收盘'] > current_ma5 > prev_ma5:
-                    result += "趋势：短期上升趋势\n"
+                    result.field("趋势", "短期上升趋势")
                 elif latest['收盘'] < current_ma5 < prev_ma5:
-                    result += "趋势：短期下降趋势\n"
+                    result.field("趋势", "短期下降趋势")
                 else:
-                    result += "趋势：震荡整理\n"
+                    result.field("趋势", "震荡整理")
 
             return result
 
         except Exception as e:
-            return f"获取港股历史数据失败: {str(e)}"
+            return ToolError(f"获取港股历史数据失败: {str(e)}")
 
-    def _get_financial_data(self, stock_code: str) -> str:
+    def _get_financial_data(self, stock_code: str) -> Any:
         """获取财务数据"""
         try:
             # 判断是否为港股
@@ -383,55 +474,55 @@ class AStockDataTool(BaseTool):
 
             # 获取主要财务指标
             try:
-                df = ak.stock_financial_analysis_indicator(symbol=code)
+                df = fetch(lambda: get_financial_indicator(code))
             except Exception as e:
-                return f"获取财务数据失败: {str(e)}"
+                return ToolError(f"获取财务数据失败: {str(e)}")
 
             if df.empty:
                 # 如果第一个函数失败，尝试使用同花顺的财务摘要数据
                 try:
-                    df = ak.stock_financial_abstract_ths(symbol=code)
+                    df = fetch(lambda: ak.stock_financial_abstract_ths(symbol=code))
                     if df.empty:
                         return f"未找到股票 {stock_code} 的财务数据"
                 except Exception as e:
-                    return f"未找到股票 {stock_code} 的财务数据: {str(e)}"
+                    return ToolError(f"未找到股票 {stock_code} 的财务数据: {str(e)}")
 
             # 获取最新的财务数据
             latest_data = df.iloc[-1]
 
-            # 构建结果字符串，根据可用字段动态调整
-            result = f"股票 {stock_code} 主要财务指标：\n\n"
-            result += "盈利能力：\n"
+            # 构建结果，根据可用字段动态调整
+            result = Report(f"股票 {stock_code} 主要财务指标", text=f"股票 {stock_code} 主要财务指标：\n")
+            result.section("盈利能力", text="\n盈利能力：\n")
             
             # 检查并添加可用的字段，添加严格的类型转换和错误处理
             if '每股收益' in df.columns and pd.notna(latest_data['每股收益']):
                 try:
                     eps_value = float(latest_data['每股收益'])
-                    result += f"  每股收益：{eps_value:.3f}元\n"
+                    result.field("每股收益", f"{eps_value:.3f}元", text=f"  每股收益：{eps_value:.3f}元\n")
                 except (ValueError, TypeError):
-                    result += f"  每股收益：{latest_data['每股收益']}\n"
+                    result.field("每股收益", latest_data['每股收益'], text=f"  每股收益：{latest_data['每股收益']}\n")
             
             if '净资产收益率' in df.columns and pd.notna(latest_data['净资产收益率']):
                 try:
                     roe_value = float(latest_data['净资产收益率'])
-                    result += f"  净资产收益率：{roe_value:.2f}%\n"
+                    result.field("净资产收益率", f"{roe_value:.2f}%", text=f"  净资产收益率：{roe_value:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  净资产收益率：{latest_data['净资产收益率']}\n"
+                    result.field("净资产收益率", latest_data['净资产收益率'], text=f"  净资产收益率：{latest_data['净资产收益率']}\n")
             elif '净资产收益率-摊薄' in df.columns and pd.notna(latest_data['净资产收益率-摊薄']):
                 try:
                     roe_value = float(latest_data['净资产收益率-摊薄'])
-                    result += f"  净资产收益率：{roe_value:.2f}%\n"
+                    result.field("净资产收益率", f"{roe_value:.2f}%", text=f"  净资产收益率：{roe_value:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  净资产收益率：{latest_data['净资产收益率-摊薄']}\n"
+                    result.field("净资产收益率", latest_data['净资产收益率-摊薄'], text=f"  净资产收益率：{latest_data['净资产收益率-摊薄']}\n")
             
             if '销售毛利率' in df.columns and pd.notna(latest_data['销售毛利率']):
                 try:
                     gross_margin = float(latest_data['销售毛利率'])
-                    result += f"  销售毛利率：{gross_margin:.2f}%\n"
+                    result.field("销售毛利率", f"{gross_margin:.2f}%", text=f"  销售毛利率：{gross_margin:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  销售毛利率：{latest_data['销售毛利率']}\n"
+                    result.field("销售毛利率", latest_data['销售毛利率'], text=f"  销售毛利率：{latest_data['销售毛利率']}\n")
             
-            result += "\n偿债能力：\n"
+            result.section("偿债能力", text="\n偿债能力：\n")
             if '资产负债率' in df.columns and pd.notna(latest_data['资产负债率']):
                 try:
                     # 确保资产负债率是数值
@@ -440,25 +531,25 @@ class AStockDataTool(BaseTool):
                         debt_ratio = float(latest_data['资产负债率'].replace('%', '').strip())
                     else:
                         debt_ratio = float(latest_data['资产负债率'])
-                    result += f"  资产负债率：{debt_ratio:.2f}%\n"
+                    result.field("资产负债率", f"{debt_ratio:.2f}%", text=f"  资产负债率：{debt_ratio:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  资产负债率：{latest_data['资产负债率']}\n"
+                    result.field("资产负债率", latest_data['资产负债率'], text=f"  资产负债率：{latest_data['资产负债率']}\n")
             
             if '流动比率' in df.columns and pd.notna(latest_data['流动比率']):
                 try:
                     current_ratio = float(latest_data['流动比率'])
-                    result += f"  流动比率：{current_ratio:.2f}\n"
+                    result.field("流动比率", f"{current_ratio:.2f}", text=f"  流动比率：{current_ratio:.2f}\n")
                 except (ValueError, TypeError):
-                    result += f"  流动比率：{latest_data['流动比率']}\n"
+                    result.field("流动比率", latest_data['流动比率'], text=f"  流动比率：{latest_data['流动比率']}\n")
             
             if '速动比率' in df.columns and pd.notna(latest_data['速动比率']):
                 try:
                     quick_ratio = float(latest_data['速动比率'])
-                    result += f"  速动比率：{quick_ratio:.2f}\n"
+                    result.field("速动比率", f"{quick_ratio:.2f}", text=f"  速动比率：{quick_ratio:.2f}\n")
                 except (ValueError, TypeError):
-                    result += f"  速动比率：{latest_data['速动比率']}\n"
+                    result.field("速动比率", latest_data['速动比率'], text=f"  速动比率：{latest_data['速动比率']}\n")
             
-            result += "\n成长能力：\n"
+            result.section("成长能力", text="\n成长能力：\n")
             if '净利润同比增长率' in df.columns and pd.notna(latest_data['净利润同比增长率']):
                 try:
                     # 处理不同格式的增长率
@@ -469,20 +560,20 @@ class AStockDataTool(BaseTool):
                             growth_rate = float(latest_data['净利润同比增长率'])
                     else:
                         growth_rate = float(latest_data['净利润同比增长率'])
-                    result += f"  净利润同比增长：{growth_rate:.2f}%\n"
+                    result.field("净利润同比增长", f"{growth_rate:.2f}%", text=f"  净利润同比增长：{growth_rate:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  净利润同比增长：{latest_data['净利润同比增长率']}\n"
+                    result.field("净利润同比增长", latest_data['净利润同比增长率'], text=f"  净利润同比增长：{latest_data['净利润同比增长率']}\n")
             
             # 添加报告期信息
             if '报告期' in df.columns:
-                result += f"\n报告期：{latest_data['报告期']}\n"
+                result.field("报告期", latest_data['报告期'], text=f"\n报告期：{latest_data['报告期']}\n")
 
             return result
 
         except Exception as e:
-            return f"获取财务数据失败: {str(e)}"
+            return ToolError(f"获取财务数据失败: {str(e)}")
 
-    def _get_hk_financial_data(self, stock_code: str) -> str:
+    def _get_hk_financial_data(self, stock_code: str) -> Any:
         """获取港股财务数据"""
         try:
             # 提取港股代码，去掉.HK后缀
@@ -490,13 +581,13 @@ class AStockDataTool(BaseTool):
             
             # 获取港股财务数据
             try:
-                df = ak.stock_financial_hk_analysis_indicator_em(symbol=code)
+                df = fetch(lambda: ak.stock_financial_hk_analysis_indicator_em(symbol=code))
             except Exception as e:
                 # 尝试其他港股财务数据函数
                 try:
-                    df = ak.stock_financial_hk_report_em(symbol=code)
+                    df = fetch(lambda: ak.stock_financial_hk_report_em(symbol=code))
                 except Exception as e2:
-                    return f"获取港股财务数据失败: {str(e2)}"
+                    return ToolError(f"获取港股财务数据失败: {str(e2)}")
 
             if df.empty:
                 return f"未找到港股 {stock_code} 的财务数据"
@@ -504,51 +595,51 @@ class AStockDataTool(BaseTool):
             # 获取最新的财务数据
             latest_data = df.iloc[-1]
 
-            # 构建结果字符串
-            result = f"港股 {stock_code} 主要财务指标：\n\n"
-            result += "盈利能力：\n"
+            # 构建结果
+            result = Report(f"港股 {stock_code} 主要财务指标", text=f"港股 {stock_code} 主要财务指标：\n")
+            result.section("盈利能力", text="\n盈利能力：\n")
             
             # 检查并添加可用的字段
             if '每股收益' in df.columns and pd.notna(latest_data['每股收益']):
                 try:
                     eps_value = float(latest_data['每股收益'])
-                    result += f"  每股收益：{eps_value:.3f}港币\n"
+                    result.field("每股收益", f"{eps_value:.3f}港币", text=f"  每股收益：{eps_value:.3f}港币\n")
                 except (ValueError, TypeError):
-                    result += f"  每股收益：{latest_data['每股收益']}港币\n"
+                    result.field("每股收益", f"{latest_data['每股收益']}港币", text=f"  每股收益：{latest_data['每股收益']}港币\n")
             
             if '净资产收益率' in df.columns and pd.notna(latest_data['净资产收益率']):
                 try:
                     roe_value = float(latest_data['净资产收益率'])
-                    result += f"  净资产收益率：{roe_value:.2f}%\n"
+                    result.field("净资产收益率", f"{roe_value:.2f}%", text=f"  净资产收益率：{roe_value:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  净资产收益率：{latest_data['净资产收益率']}\n"
+                    result.field("净资产收益率", latest_data['净资产收益率'], text=f"  净资产收益率：{latest_data['净资产收益率']}\n")
             
             if '毛利率' in df.columns and pd.notna(latest_data['毛利率']):
                 try:
                     gross_margin = float(latest_data['毛利率'])
-                    result += f"  毛利率：{gross_margin:.2f}%\n"
+                    result.field("毛利率", f"{gross_margin:.2f}%", text=f"  毛利率：{gross_margin:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  毛利率：{latest_data['毛利率']}\n"
+                    result.field("毛利率", latest_data['毛利率'], text=f"  毛利率：{latest_data['毛利率']}\n")
             
-            result += "\n偿债能力：\n"
+            result.section("偿债能力", text="\n偿债能力：\n")
             if '资产负债率' in df.columns and pd.notna(latest_data['资产负债率']):
                 try:
                     if isinstance(latest_data['资产负债率'], str):
                         debt_ratio = float(latest_data['资产负债率'].replace('%', '').strip())
                     else:
                         debt_ratio = float(latest_data['资产负债率'])
-                    result += f"  资产负债率：{debt_ratio:.2f}%\n"
+                    result.field("资产负债率", f"{debt_ratio:.2f}%", text=f"  资产负债率：{debt_ratio:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  资产负债率：{latest_data['资产负债率']}\n"
+                    result.field("资产负债率", latest_data['资产负债率'], text=f"  资产负债率：{latest_data['资产负债率']}\n")
             
             if '流动比率' in df.columns and pd.notna(latest_data['流动比率']):
                 try:
                     current_ratio = float(latest_data['流动比率'])
-                    result += f"  流动比率：{current_ratio:.2f}\n"
+                    result.field("流动比率", f"{current_ratio:.2f}", text=f"  流动比率：{current_ratio:.2f}\n")
                 except (ValueError, TypeError):
-                    result += f"  流动比率：{latest_data['流动比率']}\n"
+                    result.field("流动比率", latest_data['流动比率'], text=f"  流动比率：{latest_data['流动比率']}\n")
             
-            result += "\n成长能力：\n"
+            result.section("成长能力", text="\n成长能力：\n")
             if '净利润增长率' in df.columns and pd.notna(latest_data['净利润增长率']):
                 try:
                     if isinstance(latest_data['净利润增长率'], str):
@@ -558,49 +649,51 @@ class AStockDataTool(BaseTool):
                             growth_rate = float(latest_data['净利润增长率'])
                     else:
                         growth_rate = float(latest_data['净利润增长率'])
-                    result += f"  净利润增长率：{growth_rate:.2f}%\n"
+                    result.field("净利润增长率", f"{growth_rate:.2f}%", text=f"  净利润增长率：{growth_rate:.2f}%\n")
                 except (ValueError, TypeError):
-                    result += f"  净利润增长率：{latest_data['净利润增长率']}\n"
+                    result.field("净利润增长率", latest_data['净利润增长率'], text=f"  净利润增长率：{latest_data['净利润增长率']}\n")
             
             # 添加报告期信息
             if '报告期' in df.columns:
-                result += f"\n报告期：{latest_data['报告期']}\n"
+                result.field("报告期", latest_data['报告期'], text=f"\n报告期：{latest_data['报告期']}\n")
 
             return result
 
         except Exception as e:
-            return f"获取港股财务数据失败: {str(e)}"
+            return ToolError(f"获取港股财务数据失败: {str(e)}")
 
-    def _get_sector_data(self) -> str:
+    def _get_sector_data(self) -> Any:
         """获取行业板块数据"""
         try:
-            # 获取行业板块数据，并添加异常处理
-            try:
-                df = ak.stock_sector_spot()
-            except Exception as e:
-                # 尝试使用备用函数获取板块数据
+            # 获取行业板块数据：按可用性与近期耗时排序依次尝试，熔断中的数据源不再等待超时
+            df, source, first_error = None, None, None
+            for source in registry.rank(SECTOR_SOURCES):
                 try:
-                    df = ak.stock_board_industry_name_ths()
-                    # 如果获取到的是板块名称列表而不是数据框，进行特殊处理
-                    if isinstance(df, list):
-                        result = "行业板块列表：\n\n"
-                        for i, sector in enumerate(df[:10]):
-                            result += f"{i+1}. {sector}\n"
-                        return result
-                    elif not df.empty:
-                        # 基本数据处理
-                        result = "行业板块列表：\n\n"
-                        for i, row in df.iterrows():
-                            if i >= 10:  # 限制显示前10个
-                                break
-                            # 尝试获取板块名称，处理不同的数据结构
-                            sector_name = row.get('板块名称') or row.get('行业名称') or row.get(0) or str(row)
-                            result += f"{i+1}. {sector_name}\n"
-                        return result
-                except:
-                    # 如果备用函数也失败，返回通用错误信息
-                    return f"获取行业板块数据失败: {str(e)}"
-            
+                    df = fetch(lambda source=source: get_market_table(source))
+                    break
+                except Exception as e:
+                    first_error = first_error or e
+            if df is None:
+                return ToolError(f"获取行业板块数据失败: {str(first_error)}")
+
+            if source == 'stock_board_industry_name_ths':
+                # 备用接口只有板块名称列表，没有涨跌幅数据
+                if isinstance(df, list):
+                    result = Report("行业板块列表", text="行业板块列表：\n\n")
+                    for i, sector in enumerate(df[:10]):
+                        result.note(f"{i+1}. {sector}\n", value=sector)
+                    return result
+                elif not df.empty:
+                    # 基本数据处理
+                    result = Report("行业板块列表", text="行业板块列表：\n\n")
+                    for i, row in df.iterrows():
+                        if i >= 10:  # 限制显示前10个
+                            break
+                        # 尝试获取板块名称，处理不同的数据结构
+                        sector_name = row.get('板块名称') or row.get('行业名称') or row.get(0) or str(row)
+                        result.note(f"{i+1}. {sector_name}\n", value=sector_name)
+                    return result
+
             if df.empty:
                 return "暂无行业板块数据"
             
@@ -617,8 +710,9 @@ class AStockDataTool(BaseTool):
             if '领涨股' in df.columns and '股票名称' not in df.columns:
                 df = df.rename(columns={'领涨股': '股票名称'})
             
-            # 构建结果字符串
-            result = "行业板块涨跌幅排行（前10）：\n\n"
+            # 构建结果
+            result = Report("行业板块涨跌幅排行（前10）", text="行业板块涨跌幅排行（前10）：\n\n")
+            result.columns(['板块', '涨跌幅', '领涨股'], text="")
             for idx, row in df.iterrows():
                 # 安全地获取涨跌幅和领涨股信息
                 sector_name = row.get('板块') or str(row.get(0) or row.get('行业名称') or '未知板块')
@@ -641,9 +735,10 @@ class AStockDataTool(BaseTool):
                 else:
                     leading_stock = "--"
                 
-                result += f"{idx+1}. {sector_name}: {change_text} - 领涨股: {leading_stock}\n"
+                result.row([sector_name, change_text, leading_stock],
+                           text=f"{idx+1}. {sector_name}: {change_text} - 领涨股: {leading_stock}\n")
             
             return result
             
         except Exception as e:
-            return f"获取行业板块数据失败: {str(e)}"
+            return ToolError(f"获取行业板块数据失败: {str(e)}")
@@ -1,8 +1,13 @@
 from crewai.tools import BaseTool
+from typing import Any
+from pydantic import Field
 import ast
 import operator
 import re
 
+from .tool_memo import memoized
+from .tracing import traced
+
 
 class CalculatorTool(BaseTool):
     name: str = "计算器工具"
@@ -10,7 +15,10 @@ class CalculatorTool(BaseTool):
         "用于执行各种数学计算，如加法、减法、乘法、除法等。"
         "输入应该是一个数学表达式，例如'200*7'或'5000/2*10'。"
     )
+    memo: Any = Field(default=None, exclude=True)
 
+    @traced("tool")
+    @memoized
     def _run(self, operation: str) -> float:
         try:
             # 定义允许的安全运算符
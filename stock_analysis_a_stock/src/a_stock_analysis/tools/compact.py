@@ -0,0 +1,165 @@
+"""
+紧凑输出模块
+工具在计算出各项数值的地方用 Report 同时记录文本报告的各行和固定结构的键值（章节、键值、表格行），
+text 格式原样输出文本报告，compact 格式只渲染键值为紧凑文本，并统计两种格式的token数，用于衡量每次运行节省的上下文
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from .tracing import current_run_id
+
+
+# 工具默认输出格式：text（完整文本）或 compact（紧凑键值文本），可被调用参数覆盖
+TOOL_OUTPUT_FORMAT = os.getenv("TOOL_OUTPUT_FORMAT", "text").lower()
+OUTPUT_FORMATS = ("text", "compact")
+
+# 用于计数的tiktoken编码，未安装tiktoken时按字符估算
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+_STARS = re.compile(r"⭐+")
+_EMOJI = re.compile("[\U0001F000-\U0001FAFF\u2190-\u21FF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]")
+_CJK = re.compile("[\u3000-\u303F\u4E00-\u9FFF\uFF00-\uFFEF]")
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """文本的token数；未安装tiktoken时按 中文字符1个/其他字符4个 估算"""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception:
+                    _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    cjk = len(_CJK.findall(text))
+    return cjk + -(-(len(text) - cjk) // 4)
+
+
+def _clean(text: Any) -> str:
+    """去掉表情符号，星级改为“N星”，合并多余空格"""
+    text = _STARS.sub(lambda m: f"{len(m.group())}星", str(text))
+    return " ".join(_EMOJI.sub("", text).split())
+
+
+class Report:
+    """
+    工具报告的构建器。每次添加内容时给出紧凑格式的结构化值，text 为该内容在文本报告中的原样文字：
+    section 章节、field 键值、columns/row 表格、note 无键值的说明行、add 只出现在文本报告中的装饰文字。
+    str(report) 为文本报告，entries 按添加顺序保存结构化内容
+    """
+
+    def __init__(self, title: str, text: Optional[str] = None):
+        self.title = title
+        self.entries: List[tuple] = []
+        self._text: List[str] = [f"{title}：\n" if text is None else text]
+
+    def add(self, text: str) -> "Report":
+        self._text.append(text)
+        return self
+
+    def section(self, name: str, text: Optional[str] = None) -> "Report":
+        self.entries.append(("section", name))
+        return self.add(f"\n=== {name} ===\n" if text is None else text)
+
+    def field(self, key: str, value: Any, text: Optional[str] = None) -> "Report":
+        self.entries.append(("field", key, value))
+        return self.add(f"{key}：{value}\n" if text is None else text)
+
+    def columns(self, names: Sequence[str], text: str) -> "Report":
+        self.entries.append(("columns", list(names)))
+        return self.add(text)
+
+    def row(self, values: Sequence[Any], text: str) -> "Report":
+        self.entries.append(("row", list(values)))
+        return self.add(text)
+
+    def note(self, text: str, value: Optional[str] = None) -> "Report":
+        self.entries.append(("note", text.strip().lstrip("•").strip() if value is None else value))
+        return self.add(text)
+
+    def __str__(self) -> str:
+        return "".join(self._text)
+
+
+class TokenStats:
+    """文本/紧凑输出的token数，按运行ID分别累计，并发运行的多个crew互不影响"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: Dict[Optional[str], Dict[str, Counter]] = {}
+
+    def record(self, tool_name: str, text_tokens: int, compact_tokens: int) -> None:
+        with self._lock:
+            run = self._runs.setdefault(current_run_id(), {"text": Counter(), "compact": Counter()})
+            run["text"][tool_name] += text_tokens
+            run["compact"][tool_name] += compact_tokens
+
+    def discard(self, run_id: Optional[str] = None) -> None:
+        """丢弃某次运行（默认当前运行）的统计"""
+        with self._lock:
+            self._runs.pop(run_id or current_run_id(), None)
+
+    def summary(self, run_id: Optional[str] = None) -> str:
+        """某次运行（默认当前运行）的累计节省"""
+        with self._lock:
+            run = self._runs.get(run_id or current_run_id())
+            if not run:
+                return ""
+            text, compact = sum(run["text"].values()), sum(run["compact"].values())
+        if not text:
+            return ""
+        return f"紧凑输出：{text} → {compact} tokens，节省 {(1 - compact / text) * 100:.1f}%"
+
+
+token_stats = TokenStats()
+
+
+def render_compact(report: Report) -> str:
+    """
+    将报告的结构化内容渲染为紧凑键值文本，结构固定并保持添加顺序：
+    首行 title=标题，章节为 [章节]，键值为 键=值，表格为 cols=列1|列2 后接每行 值1|值2，
+    说明行去掉表情后原样列出。工具名和调用参数Agent已知，不再重复
+    """
+    lines = [f"title={_clean(report.title)}"]
+    for kind, *values in report.entries:
+        if kind == "section":
+            lines.append(f"[{_clean(values[0])}]")
+        elif kind == "field":
+            lines.append(f"{_clean(values[0])}={_clean(values[1])}")
+        elif kind == "columns":
+            lines.append("cols=" + "|".join(_clean(v) for v in values[0]))
+        elif kind == "row":
+            lines.append("|".join(_clean(v) for v in values[0]))
+        else:
+            lines.append(_clean(values[0]))
+    return "\n".join(line for line in lines if line)
+
+
+def format_output(tool_name: str, result: Any, output_format: Optional[str] = None) -> Any:
+    """
+    按输出格式返回工具结果：text 为文本报告，compact 见 render_compact，末行附 tokens=文本token数→紧凑token数。
+    错误信息（ToolError）和其他纯文本结果原样返回
+    """
+    output_format = (output_format or TOOL_OUTPUT_FORMAT).lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}，可选：{', '.join(OUTPUT_FORMATS)}")
+    if not isinstance(result, Report):
+        return result
+    text = str(result)
+    if output_format == "text":
+        return text
+
+    body = render_compact(result)
+    text_tokens, compact_tokens = count_tokens(text), count_tokens(body)
+    token_stats.record(tool_name, text_tokens, compact_tokens)
+    return f"{body}\ntokens={text_tokens}→{compact_tokens}"
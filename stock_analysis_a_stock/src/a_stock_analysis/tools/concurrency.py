@@ -0,0 +1,233 @@
+"""
+并发拉取模块
+在共享线程池中同时发起多个互不依赖的数据请求，每个数据源单独设置超时，
+工具的总耗时由最慢的数据源决定，而不是各数据源耗时之和。
+工具调用还有一个总时限（deadline），其中的全部数据请求共享该预算，用尽后放弃仍未返回的请求
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Sequence
+
+
+# 单个数据源的默认超时（秒）与共享线程池大小
+SOURCE_TIMEOUT = float(os.getenv("SOURCE_TIMEOUT", "15"))
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "16"))
+
+# 对冲请求：主数据源在该时间（秒）内没有返回可用结果时发起备用数据源请求，0 表示同时发起
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "2"))
+
+# 单次工具调用的总时限（秒），0 表示不限
+TOOL_DEADLINE_SECONDS = float(os.getenv("TOOL_DEADLINE_SECONDS", "45"))
+
+# 标记共享线程池的工作线程，其中发起的嵌套请求就地执行（见 _submit）
+_worker = threading.local()
+
+
+def _mark_worker() -> None:
+    _worker.active = True
+
+
+_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch", initializer=_mark_worker)
+
+# 当前调用链的截止时间（time.monotonic），提交到线程池的请求沿用提交时的上下文
+_deadline: contextvars.ContextVar = contextvars.ContextVar("fetch_deadline", default=None)
+
+
+# 当前调用链中发生过的超时，见 track_timeouts
+_timeouts: contextvars.ContextVar = contextvars.ContextVar("fetch_timeouts", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """工具调用的总时限已用尽"""
+
+
+@contextmanager
+def track_timeouts():
+    """
+    记录块内（含提交到线程池的请求）发生的数据请求超时，产出超时说明的列表；
+    工具捕获超时后仍返回部分结果，调用方据此判断结果是否完整
+    """
+    seen: list = []
+    token = _timeouts.set(seen)
+    try:
+        yield seen
+    finally:
+        _timeouts.reset(token)
+
+
+def _timed_out(error: TimeoutError) -> TimeoutError:
+    seen = _timeouts.get()
+    if seen is not None:
+        seen.append(str(error))
+    return error
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """在 seconds 秒的预算内执行，已有更早的截止时间时沿用更早的；seconds 为空或不大于0时不另设时限"""
+    current = _deadline.get()
+    if seconds is not None and seconds > 0:
+        expires = time.monotonic() + seconds
+        current = expires if current is None else min(current, expires)
+    token = _deadline.set(current)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """当前预算的剩余秒数，不在时限内时为 None"""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def check_deadline() -> None:
+    """预算已用尽时抛出 DeadlineExceeded，用于在发起新请求前提前放弃"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise _timed_out(DeadlineExceeded("工具调用时限已用尽，放弃后续数据请求（超时）"))
+
+
+def _budget(timeout: Optional[float]) -> Optional[float]:
+    """单个请求可用的等待时间：自身超时与剩余预算中较小的一个"""
+    left = remaining()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+
+def _submit(func: Callable[[], Any]) -> Future:
+    """
+    提交到共享线程池，请求在提交方的上下文（截止时间、追踪span）中执行。
+    已在线程池中的请求再发起的请求（fetch、run_parallel、hedged 嵌套调用）就地执行，
+    避免全部线程都在等待排队中的内层请求而相互阻塞
+    """
+    if getattr(_worker, "active", False):
+        future: Future = Future()
+        try:
+            future.set_result(func())
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _executor.submit(contextvars.copy_context().run, func)
+
+
+def fetch(func: Callable[[], Any], timeout: Optional[float] = SOURCE_TIMEOUT) -> Any:
+    """
+    在线程池中执行单个数据请求，最多等待 timeout 秒与剩余预算中较小的一个；
+    超时抛出 TimeoutError（预算用尽时为 DeadlineExceeded），请求在后台继续执行，结果被丢弃
+    """
+    check_deadline()
+    wait_for = _budget(timeout)
+    future = _submit(func)
+    try:
+        return future.result(timeout=wait_for)
+    except FutureTimeoutError:
+        future.cancel()
+        if timeout is None or wait_for < timeout:
+            raise _timed_out(DeadlineExceeded("工具调用时限已用尽，数据请求超时")) from None
+        raise _timed_out(TimeoutError(f"数据请求超过 {timeout:g} 秒未返回（超时）")) from None
+
+
+def with_deadline(run: Callable) -> Callable:
+    """
+    装饰工具的 _run 方法：调用可传入 deadline=秒数，默认为工具的 deadline_seconds，
+    _run 内的全部数据请求共享该预算，用尽后各章节按超时处理，返回已得到的部分
+    """
+    @wraps(run)
+    def wrapper(self, *args, **kwargs):
+        seconds = kwargs.pop("deadline", None)
+        if seconds is None:
+            seconds = getattr(self, "deadline_seconds", TOOL_DEADLINE_SECONDS)
+        with deadline(seconds):
+            return run(self, *args, **kwargs)
+    return wrapper
+
+
+class ParallelResults:
+    """一组并发请求的结果，按名称读取时只等待对应的数据源"""
+
+    def __init__(self, futures: Dict[str, Future], timeouts: Dict[str, float]):
+        self._futures = futures
+        self._timeouts = timeouts
+        self._started = time.monotonic()
+
+    def get(self, name: str) -> Any:
+        """
+        返回数据源的结果；数据源抛出的异常原样抛出，
+        超过该数据源的超时时间仍未返回时抛出 TimeoutError（请求在后台继续执行）
+        """
+        left = self._timeouts[name] - (time.monotonic() - self._started)
+        try:
+            return self._futures[name].result(timeout=max(left, 0))
+        except FutureTimeoutError:
+            budget = remaining()
+            if budget is not None and budget <= 0:
+                raise _timed_out(DeadlineExceeded(f"工具调用时限已用尽，{name} 数据请求超时")) from None
+            raise _timed_out(TimeoutError(f"{name} 数据请求超时")) from None
+
+
+def run_parallel(fetchers: Dict[str, Callable[[], Any]], timeout: float = SOURCE_TIMEOUT,
+                 timeouts: Optional[Dict[str, float]] = None) -> ParallelResults:
+    """
+    同时提交全部请求并立即返回，timeouts 可为个别数据源指定不同的超时，且不超过剩余预算。
+    在线程池内调用时各请求就地依次执行（见 _submit）。
+    """
+    timeouts = {name: _budget((timeouts or {}).get(name, timeout)) for name in fetchers}
+    futures = {name: _submit(fetch) for name, fetch in fetchers.items()}
+    return ParallelResults(futures, timeouts)
+
+
+def hedged(calls: Sequence[Callable[[], Any]], delay: float = HEDGE_DELAY_SECONDS,
+           accept: Optional[Callable[[Any], bool]] = None, timeout: Optional[float] = None) -> Any:
+    """
+    对冲请求：按顺序发起 calls，前一个请求 delay 秒内没有可用结果、失败或结果不可用时立即发起下一个，
+    返回最先得到的可用结果（accept 为空时非 None 即可用）。
+    胜出后取消尚未开始的请求，已在执行的请求无法中断，其结果被丢弃。
+    全部请求都没有可用结果时，有返回值则返回最后一个返回值，否则抛出最后一个异常；
+    设置 timeout 时，超过该秒数仍无结果抛出 TimeoutError；timeout 不超过剩余预算。
+    """
+    check_deadline()
+    accept = accept or (lambda result: result is not None)
+    timeout = _budget(timeout)
+    expires = None if timeout is None else time.monotonic() + timeout
+    queue = list(calls)
+    running = set()
+    completed, last_result, last_error = False, None, None
+
+    while queue or running:
+        if queue:
+            running.add(_submit(queue.pop(0)))
+        left = None if expires is None else expires - time.monotonic()
+        if left is not None and left <= 0:
+            break
+        wait_for = delay if queue else left
+        if queue and left is not None:
+            wait_for = min(delay, left)
+        done, running = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if accept(result):
+                for loser in running:
+                    loser.cancel()
+                return result
+            completed, last_result = True, result
+    if running:
+        for loser in running:
+            loser.cancel()
+        raise _timed_out(TimeoutError(f"对冲请求在 {timeout:g} 秒内没有返回可用结果"))
+    if completed or last_error is None:
+        return last_result
+    raise last_error
@@ -0,0 +1,227 @@
+"""
+数据缓存模块
+为全市场行情快照等高开销数据提供进程级TTL缓存，供各工具共享
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from .datasource import ak
+from .tracing import tracer
+
+
+# 本地持久化数据的根目录（日线存储、财务缓存等）
+CACHE_DIR = os.getenv("A_STOCK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".a_stock_analysis"))
+
+# 全市场快照缓存配置（秒 / 条目数），可通过环境变量调整
+SPOT_CACHE_TTL = float(os.getenv("SPOT_CACHE_TTL", "60"))
+SPOT_CACHE_MAX_ENTRIES = int(os.getenv("SPOT_CACHE_MAX_ENTRIES", "8"))
+
+# 允许缓存的全市场行情接口
+SPOT_SOURCES = (
+    "stock_zh_a_spot",
+    "stock_zh_a_spot_em",
+    "stock_hk_spot",
+    "stock_hk_spot_em",
+)
+
+# 市场级数据表（北向资金、行业资金流、新闻、板块、交易日历）的缓存时间（秒）
+MARKET_TABLE_TTL = float(os.getenv("MARKET_TABLE_TTL", "300"))
+
+# 允许缓存的市场级数据接口（无参数，与个股无关）
+MARKET_TABLES = (
+    "stock_hsgt_north_net_flow_in",
+    "stock_sector_fund_flow_rank",
+    "stock_news_em",
+    "stock_news_jrj",
+    "stock_sector_spot",
+    "stock_board_industry_name_ths",
+    "tool_trade_date_hist_sina",
+)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """线程安全的TTL缓存，超出容量时淘汰最久未使用的条目；设置name时在追踪中记录命中/未命中"""
+
+    def __init__(self, ttl: float, max_entries: int = 128, name: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: dict = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取未过期的缓存值"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """写入缓存，并淘汰过期及超出容量的条目"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any],
+                    should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """读取缓存，未命中时调用loader加载；同一key并发请求只加载一次"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self._trace(key, "hit")
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # 等待期间其他线程可能已完成加载
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                self._trace(key, "hit")
+                return value
+            self._trace(key, "miss")
+            value = loader()
+            if should_cache is None or should_cache(value):
+                self.set(key, value)
+            return value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """删除指定条目，key为空时清空缓存"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _trace(self, key: Hashable, result: str) -> None:
+        if self.name:
+            tracer.event("cache", self.name, key=str(key), cache=result)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+class SpotRow:
+    """快照中单只股票的只读行视图，按列直接读取底层数组，不复制数据"""
+
+    __slots__ = ("_columns", "_pos")
+
+    def __init__(self, columns: dict, pos: int):
+        self._columns = columns
+        self._pos = pos
+
+    def __getitem__(self, field: str) -> Any:
+        return self._columns[field][self._pos]
+
+    def __contains__(self, field: object) -> bool:
+        return field in self._columns
+
+    def get(self, field: str, default: Any = None) -> Any:
+        column = self._columns.get(field)
+        return default if column is None else column[self._pos]
+
+    def keys(self):
+        return self._columns.keys()
+
+
+class SpotSnapshot:
+    """全市场行情快照，获取时一次性建立 代码→行号 索引，按代码查询为O(1)"""
+
+    def __init__(self, df, source: str = ""):
+        self.df = df
+        self.source = source
+        self.fetched_at = time.time()
+        # 各列的底层数组（单一类型列为视图，不复制）
+        self._columns = {col: df[col].to_numpy() for col in df.columns}
+        self._index = self._build_index(df)
+
+    @staticmethod
+    def _build_index(df) -> dict:
+        index: dict = {}
+        if "代码" not in df.columns:
+            return index
+        for pos, code in enumerate(df["代码"].astype(str)):
+            index.setdefault(code, pos)
+        # 新浪等数据源使用sh600519格式，同时登记纯数字代码
+        for code, pos in list(index.items()):
+            if code[:2].lower() in ("sh", "sz", "bj") and code[2:].isdigit():
+                index.setdefault(code[2:], pos)
+        return index
+
+    def lookup(self, code: str) -> Optional[SpotRow]:
+        """按股票代码查询行情行，不存在时返回None"""
+        pos = self._index.get(code)
+        if pos is None:
+            return None
+        return SpotRow(self._columns, pos)
+
+    def __contains__(self, code: object) -> bool:
+        return code in self._index
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @property
+    def empty(self) -> bool:
+        return self.df.empty
+
+
+_spot_cache = TTLCache(ttl=SPOT_CACHE_TTL, max_entries=SPOT_CACHE_MAX_ENTRIES, name="spot_snapshot")
+
+
+def get_spot_snapshot(source: str = "stock_zh_a_spot") -> SpotSnapshot:
+    """
+    获取全市场实时行情快照，TTL内所有工具共享同一次下载。
+    快照及其DataFrame为共享对象，调用方不得原地修改。
+    """
+    if source not in SPOT_SOURCES:
+        raise ValueError(f"不支持的行情快照数据源: {source}")
+    return _spot_cache.get_or_load(
+        source,
+        lambda: SpotSnapshot(getattr(ak, source)(), source=source),
+        should_cache=lambda snapshot: not snapshot.empty,
+    )
+
+
+def clear_spot_cache() -> None:
+    """清空全市场行情快照缓存"""
+    _spot_cache.invalidate()
+
+
+_table_cache = TTLCache(ttl=MARKET_TABLE_TTL, max_entries=len(MARKET_TABLES), name="market_table")
+
+
+def get_market_table(name: str) -> Any:
+    """
+    获取市场级数据表，TTL内所有工具共享同一次下载。
+    返回值为共享对象，调用方不得原地修改。
+    """
+    if name not in MARKET_TABLES:
+        raise ValueError(f"不支持的市场数据接口: {name}")
+    return _table_cache.get_or_load(
+        name,
+        lambda: getattr(ak, name)(),
+        should_cache=lambda table: table is not None and len(table) > 0,
+    )
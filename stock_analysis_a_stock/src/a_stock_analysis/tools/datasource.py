@@ -0,0 +1,64 @@
+"""
+数据源访问模块
+各模块通过 `from .datasource import ak` 调用akshare接口，每次调用按接口名记录追踪span，
+经过按接口的限流（见 rate_limit 模块）、熔断与耗时统计（见 source_registry 模块），
+并按 REPLAY_MODE 直连、录制或回放（见 replay 模块）。
+akshare 在第一次调用接口时才导入，导入本模块不加载akshare的依赖
+"""
+
+import importlib
+import threading
+from functools import wraps
+from typing import Any
+
+from .concurrency import check_deadline
+from .rate_limit import get_limiter
+from .replay import get_fixture_store
+from .source_registry import registry
+from .tracing import payload_size, tracer
+
+
+_akshare = None
+_akshare_lock = threading.Lock()
+
+
+def _load_akshare():
+    global _akshare
+    if _akshare is None:
+        with _akshare_lock:
+            if _akshare is None:
+                _akshare = importlib.import_module("akshare")
+    return _akshare
+
+
+class _AkshareProxy:
+    """akshare模块的代理：函数调用经过追踪、限流、熔断与录制/回放，其余属性原样返回"""
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(_load_akshare(), name)
+        if not callable(attr):
+            return attr
+
+        @wraps(attr)
+        def call(*args, **kwargs):
+            # 工具调用时限已用尽时不再发起新请求
+            check_deadline()
+            store = get_fixture_store()
+            fetch = lambda: registry.call(name, lambda: store.call(name, attr, args, kwargs))
+            with tracer.span("source", name) as record:
+                limiter = get_limiter()
+                # 回放不访问网络，熔断中的接口不会发起请求，都不占用限流额度
+                if limiter is None or store.mode == "replay" or not registry.available(name):
+                    result = fetch()
+                else:
+                    with limiter.slot(name) as waited:
+                        if waited >= 0.001:
+                            record.set(throttled_seconds=round(waited, 3))
+                        result = fetch()
+                record.set(**payload_size(result))
+                return result
+
+        return call
+
+
+ak = _AkshareProxy()
@@ -0,0 +1,135 @@
+"""
+财务指标缓存模块
+按股票代码持久化 stock_financial_analysis_indicator 的结果，并记录最新报告期；
+只有在下一报告期结束、可能有新财报披露之后才重新拉取
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Optional
+
+import pandas as pd
+
+from .data_cache import CACHE_DIR, TTLCache
+from .datasource import ak
+from .tracing import tracer
+
+
+FINANCIAL_CACHE_DIR = os.getenv("FINANCIAL_CACHE_DIR", os.path.join(CACHE_DIR, "financial"))
+# 进入披露窗口后，两次检查新财报之间的最短间隔（小时）
+FINANCIAL_RECHECK_HOURS = float(os.getenv("FINANCIAL_RECHECK_HOURS", "24"))
+
+# 可能表示报告期的列名
+PERIOD_COLUMNS = ('报告期', '日期')
+
+
+def _quarter_end_after(period: date) -> date:
+    """period 之后的下一个季度末"""
+    for month, day in ((3, 31), (6, 30), (9, 30), (12, 31)):
+        candidate = date(period.year, month, day)
+        if candidate > period:
+            return candidate
+    return date(period.year + 1, 3, 31)
+
+
+def latest_report_period(df: pd.DataFrame) -> Optional[date]:
+    """数据中的最新报告期，无法识别时返回None"""
+    for column in PERIOD_COLUMNS:
+        if column in df.columns:
+            periods = pd.to_datetime(df[column], errors='coerce').dropna()
+            if not periods.empty:
+                return periods.max().date()
+    return None
+
+
+class FinancialIndicatorCache:
+    """报告期感知的财务指标缓存：内存 + 磁盘两级"""
+
+    def __init__(self, root: str = FINANCIAL_CACHE_DIR):
+        self.root = root
+        self._memory = TTLCache(ttl=FINANCIAL_RECHECK_HOURS * 3600, max_entries=1024)
+        self._lock = threading.Lock()
+        self._key_locks: dict = {}
+
+    def get(self, code: str) -> pd.DataFrame:
+        """获取财务指标；返回的DataFrame为共享对象，调用方不得原地修改"""
+        cached = self._memory.get(code)
+        if cached is not None and self._is_fresh(cached[1]):
+            tracer.event("cache", "financial_indicator", key=code, cache="hit")
+            return cached[0]
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(code, threading.Lock())
+        with key_lock:
+            cached = self._memory.get(code) or self._load(code)
+            if cached is not None and self._is_fresh(cached[1]):
+                self._memory.set(code, cached)
+                tracer.event("cache", "financial_indicator", key=code, cache="hit")
+                return cached[0]
+
+            tracer.event("cache", "financial_indicator", key=code, cache="miss")
+
+            df = ak.stock_financial_analysis_indicator(symbol=code)
+            period = latest_report_period(df) if not df.empty else None
+            meta = {
+                "latest_period": period.isoformat() if period else None,
+                "checked_at": time.time(),
+            }
+            # 空结果不缓存，下次调用重新拉取
+            if not df.empty:
+                self._save(code, df, meta)
+                self._memory.set(code, (df, meta))
+            return df
+
+    @staticmethod
+    def _is_fresh(meta: dict) -> bool:
+        # 最近检查过则不重复拉取
+        if time.time() - meta.get("checked_at", 0) < FINANCIAL_RECHECK_HOURS * 3600:
+            return True
+        latest = meta.get("latest_period")
+        if not latest:
+            return False
+        # 下一个报告期尚未结束时不可能有新财报
+        return datetime.now().date() <= _quarter_end_after(date.fromisoformat(latest))
+
+    def invalidate(self, code: str) -> None:
+        """删除某只股票的缓存（例如确知有新披露时）"""
+        self._memory.invalidate(code)
+        for path in self._paths(code):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _paths(self, code: str):
+        return os.path.join(self.root, f"{code}.pkl"), os.path.join(self.root, f"{code}.json")
+
+    def _load(self, code: str):
+        data_path, meta_path = self._paths(code)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return pd.read_pickle(data_path), meta
+        except Exception:
+            return None
+
+    def _save(self, code: str, df: pd.DataFrame, meta: dict) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        data_path, meta_path = self._paths(code)
+        # 财务数据列类型混杂（数值与百分比字符串），使用pickle保存
+        tmp_path = f"{data_path}.{os.getpid()}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, data_path)
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+
+_cache = FinancialIndicatorCache()
+
+
+def get_financial_indicator(code: str) -> pd.DataFrame:
+    """获取A股财务分析指标（stock_financial_analysis_indicator），按报告期缓存"""
+    return _cache.get(code)
@@ -0,0 +1,195 @@
+"""
+全市场技术指标引擎
+在 日期×股票 矩阵上一次性向量化计算均线、RSI、MACD、布林带、KDJ、ATR、OBV，
+结果保存为最新指标表，供单只股票的工具直接读取
+"""
+
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .data_cache import CACHE_DIR, TTLCache
+from .universe_matrix import UniverseMatrix
+
+
+INDICATOR_DIR = os.getenv("INDICATOR_DIR", os.path.join(CACHE_DIR, "indicators"))
+# 预计算指标的最长有效时间（小时），超时后工具回退为单只股票实时计算
+INDICATOR_MAX_AGE_HOURS = float(os.getenv("INDICATOR_MAX_AGE_HOURS", "24"))
+# 计算时使用的最近交易日数量，需覆盖EMA的收敛期
+INDICATOR_LOOKBACK = int(os.getenv("INDICATOR_LOOKBACK", "250"))
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """沿日期方向的滚动均值，窗口内有缺失值或数据不足时为NaN"""
+    out = np.full(x.shape, np.nan)
+    if x.shape[0] < window:
+        return out
+    valid = ~np.isnan(x)
+    zero_row = np.zeros((1,) + x.shape[1:])
+    csum = np.concatenate([zero_row, np.cumsum(np.where(valid, x, 0.0), axis=0)])
+    ccount = np.concatenate([zero_row, np.cumsum(valid, axis=0)])
+    total = csum[window:] - csum[:-window]
+    count = ccount[window:] - ccount[:-window]
+    out[window - 1:] = np.where(count == window, total / window, np.nan)
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """沿日期方向的滚动样本标准差（ddof=1）"""
+    mean = rolling_mean(x, window)
+    mean_sq = rolling_mean(x * x, window)
+    var = (mean_sq - mean * mean) * window / (window - 1)
+    return np.sqrt(np.clip(var, 0.0, None))
+
+
+def rolling_extreme(x: np.ndarray, window: int, func) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[0] < window:
+        return out
+    out[window - 1:] = func(sliding_window_view(x, window, axis=0), axis=-1)
+    return out
+
+
+def ema(x: np.ndarray, span: Optional[int] = None, alpha: Optional[float] = None) -> np.ndarray:
+    """指数移动平均，无缺失值时与 pandas ewm(adjust=False) 一致；从每只股票第一个有效值开始"""
+    alpha = alpha if alpha is not None else 2.0 / (span + 1)
+    out = np.empty(x.shape)
+    prev = np.full(x.shape[1:], np.nan)
+    for t in range(x.shape[0]):
+        row = x[t]
+        prev = np.where(np.isnan(prev), row, np.where(np.isnan(row), prev, alpha * row + (1 - alpha) * prev))
+        out[t] = prev
+    return out
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """RSI，涨跌幅按窗口简单平均"""
+    delta = np.full(close.shape, np.nan)
+    delta[1:] = close[1:] - close[:-1]
+    gain = rolling_mean(np.where(delta > 0, delta, 0.0), period)
+    loss = rolling_mean(np.where(delta < 0, -delta, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + gain / loss)
+
+
+def kdj(high: np.ndarray, low: np.ndarray, close: np.ndarray, n: int = 9, m1: int = 3, m2: int = 3):
+    """KDJ指标，K、D初始值为50"""
+    llv = rolling_extreme(low, n, np.min)
+    hhv = rolling_extreme(high, n, np.max)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = np.where(hhv > llv, (close - llv) / (hhv - llv) * 100, 50.0)
+    rsv[np.isnan(llv) | np.isnan(close)] = np.nan
+    k = np.empty(close.shape)
+    d = np.empty(close.shape)
+    prev_k = np.full(close.shape[1:], 50.0)
+    prev_d = np.full(close.shape[1:], 50.0)
+    for t in range(close.shape[0]):
+        row = rsv[t]
+        prev_k = np.where(np.isnan(row), prev_k, (m1 - 1) / m1 * prev_k + row / m1)
+        prev_d = np.where(np.isnan(row), prev_d, (m2 - 1) / m2 * prev_d + prev_k / m2)
+        k[t] = prev_k
+        d[t] = prev_d
+    return k, d, 3 * k - 2 * d
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """平均真实波幅（真实波幅的简单平均）"""
+    prev_close = np.full(close.shape, np.nan)
+    prev_close[1:] = close[:-1]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return rolling_mean(tr, period)
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """能量潮指标，缺失值按0处理"""
+    direction = np.zeros(close.shape)
+    direction[1:] = np.sign(np.nan_to_num(close[1:] - close[:-1]))
+    return np.cumsum(direction * np.nan_to_num(volume), axis=0)
+
+
+def compute_indicators(high: np.ndarray, low: np.ndarray,
+                       close: np.ndarray, volume: np.ndarray) -> Dict[str, np.ndarray]:
+    """对 日期×股票 矩阵一次性计算全部指标，返回同形状的指标矩阵"""
+    indicators = {
+        'MA5': rolling_mean(close, 5),
+        'MA10': rolling_mean(close, 10),
+        'MA20': rolling_mean(close, 20),
+        'MA30': rolling_mean(close, 30),
+        'RSI': rsi(close, 14),
+        'VOL_MA20': rolling_mean(volume, 20),
+    }
+    ema12 = ema(close, span=12)
+    ema26 = ema(close, span=26)
+    indicators['MACD'] = ema12 - ema26
+    indicators['SIGNAL'] = ema(indicators['MACD'], span=9)
+    indicators['HIST'] = indicators['MACD'] - indicators['SIGNAL']
+    std20 = rolling_std(close, 20)
+    indicators['BOLL_MID'] = indicators['MA20']
+    indicators['BOLL_UPPER'] = indicators['MA20'] + 2 * std20
+    indicators['BOLL_LOWER'] = indicators['MA20'] - 2 * std20
+    indicators['K'], indicators['D'], indicators['J'] = kdj(high, low, close)
+    indicators['ATR'] = atr(high, low, close, 14)
+    indicators['OBV'] = obv(close, volume)
+    return indicators
+
+
+def build_indicator_table(matrix: Optional[UniverseMatrix] = None,
+                          lookback: int = INDICATOR_LOOKBACK) -> pd.DataFrame:
+    """计算全市场最新指标表（每只股票一行），并保存到指标目录"""
+    matrix = matrix or UniverseMatrix.open()
+    fields = {name: np.asarray(matrix.window(name, lookback)) for name in ('high', 'low', 'close', 'volume')}
+    indicators = compute_indicators(fields['high'], fields['low'], fields['close'], fields['volume'])
+
+    table = pd.DataFrame({'代码': matrix.symbols})
+    table['日期'] = matrix.dates[-1] if matrix.dates else None
+    table['收盘'] = fields['close'][-1] if len(fields['close']) else np.nan
+    table['成交量'] = fields['volume'][-1] if len(fields['volume']) else np.nan
+    for name, values in indicators.items():
+        table[name] = values[-1] if len(values) else np.nan
+    # MACD金叉/死叉判断需要前一交易日的数值
+    for name in ('MACD', 'SIGNAL'):
+        values = indicators[name]
+        table[f'PREV_{name}'] = values[-2] if len(values) > 1 else np.nan
+
+    os.makedirs(INDICATOR_DIR, exist_ok=True)
+    path = os.path.join(INDICATOR_DIR, f"{matrix.adjust or 'none'}.parquet")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    table.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    _tables.invalidate()
+    return table
+
+
+_tables = TTLCache(ttl=300, max_entries=4)
+
+
+def _load_table(adjust: str) -> Optional[dict]:
+    path = os.path.join(INDICATOR_DIR, f"{adjust or 'none'}.parquet")
+    if not os.path.exists(path):
+        return None
+    if time.time() - os.path.getmtime(path) > INDICATOR_MAX_AGE_HOURS * 3600:
+        return None
+    table = pd.read_parquet(path)
+    # 按代码建立索引，单只股票查询为O(1)
+    return {row['代码']: row for row in table.to_dict('records')}
+
+
+def get_precomputed_indicators(code: str, adjust: str = "qfq") -> Optional[dict]:
+    """读取某只股票的预计算指标，指标表不存在或已过期时返回None"""
+    rows = _tables.get_or_load(adjust, lambda: _load_table(adjust) or {},
+                               should_cache=lambda rows: bool(rows))
+    row = rows.get(code)
+    if row is None or pd.isna(row.get('收盘')) or pd.isna(row.get('MA20')):
+        return None
+    return row
+
+
+if __name__ == "__main__":
+    # 用法：python -m tools.indicator_engine   （在全市场矩阵更新后运行）
+    started = time.perf_counter()
+    result = build_indicator_table()
+    print(f"已计算 {len(result)} 只股票的技术指标，耗时 {time.perf_counter() - started:.2f} 秒")
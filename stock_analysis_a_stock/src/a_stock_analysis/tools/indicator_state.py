@@ -0,0 +1,343 @@
+"""
+增量技术指标状态模块
+为每只股票保存EMA累加器、滚动求和窗口等指标状态，每来一根新K线以O(1)更新，
+支持从本地日线存储热启动，并可不修改状态地预览盘中价格对应的指标
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+from .data_cache import CACHE_DIR, get_spot_snapshot
+from .ohlcv_store import _ADJUST_TOLERANCE, get_daily_history, last_final_date
+
+
+INDICATOR_STATE_DIR = os.getenv("INDICATOR_STATE_DIR", os.path.join(CACHE_DIR, "indicator_state"))
+# 热启动时回看的自然日数，需覆盖MA30及EMA的收敛期
+INDICATOR_WARMUP_DAYS = int(os.getenv("INDICATOR_WARMUP_DAYS", "120"))
+
+# 状态文件格式版本，指标算法或文件结构变化时递增，旧版本文件读取时重新热启动
+STATE_VERSION = 1
+
+
+@dataclass
+class RollingMeanState:
+    """固定窗口滚动均值，维护窗口内数值与累计和"""
+    window: int
+    values: deque = field(default_factory=deque)
+    total: float = 0.0
+
+    def update(self, x: float) -> None:
+        self.values.append(x)
+        self.total += x
+        if len(self.values) > self.window:
+            self.total -= self.values.popleft()
+
+    def peek(self, x: float) -> Optional[float]:
+        """假设追加 x 后的均值，不修改状态"""
+        n = len(self.values) + 1
+        if n < self.window:
+            return None
+        total = self.total + x - (self.values[0] if n > self.window else 0.0)
+        return total / self.window
+
+    @property
+    def value(self) -> Optional[float]:
+        return self.total / self.window if len(self.values) == self.window else None
+
+    def to_dict(self) -> dict:
+        return {"window": self.window, "values": list(self.values)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RollingMeanState":
+        state = cls(window=data["window"])
+        for x in data["values"]:
+            state.update(x)
+        return state
+
+
+@dataclass
+class EMAState:
+    """指数移动平均累加器，与 pandas ewm(adjust=False) 一致"""
+    span: int
+    value: Optional[float] = None
+
+    @property
+    def alpha(self) -> float:
+        return 2.0 / (self.span + 1)
+
+    def update(self, x: float) -> None:
+        self.value = self.peek(x)
+
+    def peek(self, x: float) -> float:
+        return x if self.value is None else self.alpha * x + (1 - self.alpha) * self.value
+
+
+@dataclass
+class RSIState:
+    """RSI状态，涨跌幅按窗口简单平均，与指标引擎的 rsi 一致"""
+    period: int = 14
+    prev_close: Optional[float] = None
+    gains: RollingMeanState = None
+    losses: RollingMeanState = None
+
+    def __post_init__(self):
+        self.gains = self.gains or RollingMeanState(self.period)
+        self.losses = self.losses or RollingMeanState(self.period)
+
+    def _delta(self, close: float) -> float:
+        # 第一根K线没有涨跌，按0计入窗口
+        return 0.0 if self.prev_close is None else close - self.prev_close
+
+    def update(self, close: float) -> None:
+        delta = self._delta(close)
+        self.gains.update(max(delta, 0.0))
+        self.losses.update(max(-delta, 0.0))
+        self.prev_close = close
+
+    def peek(self, close: float) -> Optional[float]:
+        delta = self._delta(close)
+        return self._rsi(self.gains.peek(max(delta, 0.0)), self.losses.peek(max(-delta, 0.0)))
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._rsi(self.gains.value, self.losses.value)
+
+    @staticmethod
+    def _rsi(gain: Optional[float], loss: Optional[float]) -> Optional[float]:
+        if gain is None or loss is None:
+            return None
+        if loss == 0:
+            return 100.0 if gain > 0 else None
+        return 100 - 100 / (1 + gain / loss)
+
+
+class IndicatorState:
+    """单只股票的全部增量指标状态"""
+
+    MA_WINDOWS = (5, 10, 20, 30)
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.last_date: Optional[str] = None
+        self.last_close: Optional[float] = None
+        self.last_volume: Optional[float] = None
+        self.ma = {w: RollingMeanState(w) for w in self.MA_WINDOWS}
+        self.vol_ma20 = RollingMeanState(20)
+        self.rsi = RSIState(14)
+        self.ema12 = EMAState(12)
+        self.ema26 = EMAState(26)
+        self.signal = EMAState(9)
+        self.prev_macd: Optional[float] = None
+        self.prev_signal: Optional[float] = None
+
+    def update(self, bar_date: str, close: float, volume: float) -> None:
+        """提交一根已收盘K线，O(1)"""
+        if self.last_date is not None and bar_date <= self.last_date:
+            return
+        self.prev_macd, self.prev_signal = self._macd_pair()
+        for state in self.ma.values():
+            state.update(close)
+        self.vol_ma20.update(volume)
+        self.rsi.update(close)
+        self.ema12.update(close)
+        self.ema26.update(close)
+        self.signal.update(self.ema12.value - self.ema26.value)
+        self.last_date, self.last_close, self.last_volume = bar_date, close, volume
+
+    def snapshot(self) -> dict:
+        """返回最新已提交K线对应的指标"""
+        macd, signal = self._macd_pair()
+        return self._values(self.last_close, self.last_volume,
+                            {w: s.value for w, s in self.ma.items()},
+                            self.rsi.value, macd, signal, self.vol_ma20.value,
+                            self.prev_macd, self.prev_signal)
+
+    def peek(self, close: float, volume: float) -> dict:
+        """预览把盘中价格当作最新K线时的指标，不修改状态，O(1)"""
+        macd = self.ema12.peek(close) - self.ema26.peek(close)
+        signal = self.signal.peek(macd)
+        prev_macd, prev_signal = self._macd_pair()
+        return self._values(close, volume,
+                            {w: s.peek(close) for w, s in self.ma.items()},
+                            self.rsi.peek(close), macd, signal, self.vol_ma20.peek(volume),
+                            prev_macd, prev_signal)
+
+    def _macd_pair(self):
+        if self.ema12.value is None:
+            return None, None
+        return self.ema12.value - self.ema26.value, self.signal.value
+
+    @staticmethod
+    def _values(close, volume, ma, rsi, macd, signal, vol_ma20, prev_macd, prev_signal) -> dict:
+        nan = float('nan')
+        values = {'收盘': close, '成交量': volume, 'RSI': rsi, 'MACD': macd, 'SIGNAL': signal,
+                  'HIST': None if macd is None else macd - signal, 'VOL_MA20': vol_ma20,
+                  'PREV_MACD': prev_macd, 'PREV_SIGNAL': prev_signal}
+        values.update({f'MA{w}': v for w, v in ma.items()})
+        return {k: nan if v is None else v for k, v in values.items()}
+
+    def to_dict(self) -> dict:
+        return {
+            "symbol": self.symbol, "last_date": self.last_date,
+            "last_close": self.last_close, "last_volume": self.last_volume,
+            "ma": {str(w): s.to_dict() for w, s in self.ma.items()},
+            "vol_ma20": self.vol_ma20.to_dict(),
+            "rsi": {"prev_close": self.rsi.prev_close,
+                    "gains": self.rsi.gains.to_dict(), "losses": self.rsi.losses.to_dict()},
+            "ema12": self.ema12.value, "ema26": self.ema26.value, "signal": self.signal.value,
+            "prev_macd": self.prev_macd, "prev_signal": self.prev_signal,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndicatorState":
+        state = cls(data["symbol"])
+        state.last_date = data["last_date"]
+        state.last_close = data["last_close"]
+        state.last_volume = data["last_volume"]
+        state.ma = {int(w): RollingMeanState.from_dict(s) for w, s in data["ma"].items()}
+        state.vol_ma20 = RollingMeanState.from_dict(data["vol_ma20"])
+        state.rsi = RSIState(14, prev_close=data["rsi"]["prev_close"],
+                             gains=RollingMeanState.from_dict(data["rsi"]["gains"]),
+                             losses=RollingMeanState.from_dict(data["rsi"]["losses"]))
+        state.ema12.value = data["ema12"]
+        state.ema26.value = data["ema26"]
+        state.signal.value = data["signal"]
+        state.prev_macd = data["prev_macd"]
+        state.prev_signal = data["prev_signal"]
+        return state
+
+    @classmethod
+    def warm_start(cls, symbol: str, bars) -> "IndicatorState":
+        """用历史日线（含 日期/收盘/成交量 列）热启动"""
+        state = cls(symbol)
+        for bar_date, close, volume in zip(bars['日期'], bars['收盘'], bars['成交量']):
+            state.update(str(bar_date), float(close), float(volume))
+        return state
+
+
+class IndicatorStateStore:
+    """按股票保存指标状态，每只股票一个JSON文件"""
+
+    def __init__(self, root: str = INDICATOR_STATE_DIR, adjust: str = "qfq"):
+        self.root = os.path.join(root, adjust or "none")
+        self.adjust = adjust
+        self._states: Dict[str, IndicatorState] = {}
+        self._lock = threading.Lock()
+        self._key_locks: dict = {}
+
+    def get(self, symbol: str) -> IndicatorState:
+        """读取状态并补齐到最后一根已收盘K线；首次使用或复权价格变化时从日线存储热启动"""
+        with self._lock_for(symbol):
+            state = self._states.get(symbol) or self._load(symbol)
+            final = last_final_date("a").isoformat()
+            if state is None or state.last_date is None or state.last_date < final:
+                state = self._catch_up(symbol, state, final)
+            self._states[symbol] = state
+            return state
+
+    def snapshot(self, symbol: str) -> dict:
+        """最新指标：已收盘K线之外若有盘中K线，则以盘中价格预览"""
+        state = self.get(symbol)
+        history = get_daily_history(symbol, days=5, adjust=self.adjust, market="a")
+        if self._restated(state, history):
+            state = self._rebuild(symbol)
+        if not history.empty and state.last_date is not None and history['日期'].iloc[-1] > state.last_date:
+            live = history.iloc[-1]
+            return state.peek(float(live['收盘']), float(live['成交量']))
+        return state.snapshot()
+
+    def _restated(self, state: IndicatorState, bars) -> bool:
+        """
+        复权价格在除权除息后会整体重算，此前累加的EMA、滚动窗口随之失效：
+        日线存储中最后一根已提交K线的收盘价与状态不一致时返回True
+        """
+        if not self.adjust or bars.empty or state.last_date is None or state.last_close is None:
+            return False
+        same_day = bars[bars['日期'] == state.last_date]
+        if same_day.empty:
+            return False
+        close = float(same_day.iloc[0]['收盘'])
+        return abs(close - state.last_close) > _ADJUST_TOLERANCE * max(abs(state.last_close), 1.0)
+
+    def _warm_start(self, symbol: str, final: str) -> IndicatorState:
+        bars = get_daily_history(symbol, days=INDICATOR_WARMUP_DAYS, adjust=self.adjust, market="a")
+        return IndicatorState.warm_start(symbol, bars[bars['日期'] <= final] if not bars.empty else bars)
+
+    def _rebuild(self, symbol: str) -> IndicatorState:
+        with self._lock_for(symbol):
+            state = self._warm_start(symbol, last_final_date("a").isoformat())
+            self._save(state)
+            self._states[symbol] = state
+            return state
+
+    def _catch_up(self, symbol: str, state: Optional[IndicatorState], final: str) -> IndicatorState:
+        if state is None or state.last_date is None:
+            state = self._warm_start(symbol, final)
+        else:
+            # 从最后一根已提交K线开始拉取，用它校验复权价格是否变化
+            days = (date.fromisoformat(final) - date.fromisoformat(state.last_date)).days + 1
+            bars = get_daily_history(symbol, days=days, adjust=self.adjust, market="a")
+            if self._restated(state, bars):
+                state = self._warm_start(symbol, final)
+            elif not bars.empty:
+                bars = bars[(bars['日期'] > state.last_date) & (bars['日期'] <= final)]
+                for bar_date, close, volume in zip(bars['日期'], bars['收盘'], bars['成交量']):
+                    state.update(str(bar_date), float(close), float(volume))
+        self._save(state)
+        return state
+
+    def _lock_for(self, symbol: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(symbol, threading.Lock())
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.root, f"{symbol}.json")
+
+    def _load(self, symbol: str) -> Optional[IndicatorState]:
+        try:
+            with open(self._path(symbol), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 版本或复权方式不一致的状态不可续用
+            if data.get("version") != STATE_VERSION or data.get("adjust") != self.adjust:
+                return None
+            return IndicatorState.from_dict(data)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, state: IndicatorState) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(state.symbol)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({**state.to_dict(), "version": STATE_VERSION, "adjust": self.adjust}, f)
+        os.replace(tmp_path, path)
+
+
+_store = IndicatorStateStore()
+
+
+def get_indicator_snapshot(symbol: str) -> dict:
+    """单只股票的最新技术指标（增量状态）"""
+    return _store.snapshot(symbol)
+
+
+def poll_watchlist(symbols: Iterable[str]) -> Dict[str, dict]:
+    """
+    盘中轮询自选股：一次全市场快照 + 每只股票O(1)预览，总开销O(股票数)。
+    快照中找不到的股票返回最后一根已收盘K线的指标。
+    """
+    snapshot = get_spot_snapshot('stock_zh_a_spot_em')
+    results = {}
+    for symbol in symbols:
+        state = _store.get(symbol)
+        row = snapshot.lookup(symbol)
+        if row is None:
+            results[symbol] = state.snapshot()
+        else:
+            results[symbol] = state.peek(float(row['最新价']), float(row['成交量']))
+    return results
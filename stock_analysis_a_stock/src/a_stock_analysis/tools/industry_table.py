@@ -0,0 +1,191 @@
+"""
+行业汇总指标模块
+批量统计全部上市公司按行业分组的 ROE、市盈率、市净率、资产负债率分布（均值、中位数、分位数），
+结果保存为行业汇总表，同业对比时按股票代码O(1)查询
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import CACHE_DIR, TTLCache
+from .datasource import ak
+from .financial_cache import get_financial_indicator, latest_report_period
+
+
+INDUSTRY_DIR = os.getenv("INDUSTRY_DIR", os.path.join(CACHE_DIR, "industry"))
+
+# 指标名称到数据列的映射：ROE与资产负债率来自财务指标，市盈率与市净率来自行业成分股行情
+METRICS = {
+    'ROE': '净资产收益率',
+    'PE': '市盈率-动态',
+    'PB': '市净率',
+    'DEBT': '资产负债率',
+}
+PERCENTILES = (10, 25, 75, 90)
+
+# 行业汇总表不可用时使用的默认基准值
+DEFAULT_BENCHMARKS = {
+    'ROE': 12.5,
+    'PE': 18.0,
+    'PB': 2.1,
+    'DEBT': 45.0,
+}
+
+MEMBERS_FILE = "members.parquet"
+STATS_FILE = "stats.parquet"
+
+
+def _to_float(value) -> float:
+    """财务数据中可能混有 '12.5%'、'--' 等字符串，统一转为浮点数"""
+    if isinstance(value, str):
+        value = value.strip().rstrip('%').replace(',', '')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _member_row(code: str, industry: str, quote: dict) -> dict:
+    """单只股票的行业成员记录"""
+    df = get_financial_indicator(code)
+    period = latest_report_period(df) if not df.empty else None
+    latest = df.iloc[-1] if not df.empty else {}
+    return {
+        '代码': code, '行业': industry, '报告期': period.isoformat() if period else None,
+        'ROE': _to_float(latest.get(METRICS['ROE'])),
+        'DEBT': _to_float(latest.get(METRICS['DEBT'])),
+        'PE': _to_float(quote.get(METRICS['PE'])),
+        'PB': _to_float(quote.get(METRICS['PB'])),
+    }
+
+
+def aggregate(members: pd.DataFrame) -> pd.DataFrame:
+    """由成员表计算各行业的均值、中位数和分位数"""
+    members = members.copy()
+    # 亏损公司的市盈率为负，不参与估值分布统计
+    members.loc[members['PE'] <= 0, 'PE'] = np.nan
+    grouped = members.groupby('行业')
+    stats = pd.DataFrame({'公司数': grouped['代码'].count()})
+    for metric in METRICS:
+        column = grouped[metric]
+        stats[f'{metric}_mean'] = column.mean()
+        stats[f'{metric}_median'] = column.median()
+        for p in PERCENTILES:
+            stats[f'{metric}_p{p}'] = column.quantile(p / 100)
+    return stats.reset_index()
+
+
+def build_industry_table(root: str = INDUSTRY_DIR) -> pd.DataFrame:
+    """
+    批量构建行业汇总表。
+    财务指标走报告期缓存，重复运行时只有披露了新财报的公司才会重新拉取；
+    估值指标（市盈率、市净率）每次运行时随行业成分股行情一并更新。
+    """
+    previous = _read_members(root)
+    previous_rows = {row['代码']: row for row in previous.to_dict('records')} if not previous.empty else {}
+
+    rows = []
+    boards = ak.stock_board_industry_name_em()
+    for industry in boards['板块名称']:
+        try:
+            constituents = ak.stock_board_industry_cons_em(symbol=industry)
+        except Exception:
+            continue
+        for quote in constituents.to_dict('records'):
+            code = str(quote['代码'])
+            try:
+                rows.append(_member_row(code, industry, quote))
+            except Exception:
+                # 单只股票失败时保留上次的记录
+                if code in previous_rows:
+                    rows.append(previous_rows[code])
+
+    members = pd.DataFrame(rows, columns=['代码', '行业', '报告期'] + list(METRICS))
+    members = members.drop_duplicates(subset='代码', keep='first')
+    stats = aggregate(members)
+    stats['更新日期'] = datetime.now().strftime('%Y-%m-%d')
+
+    os.makedirs(root, exist_ok=True)
+    for name, table in ((MEMBERS_FILE, members), (STATS_FILE, stats)):
+        path = os.path.join(root, name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        table.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    _tables.invalidate()
+    return stats
+
+
+def _read_members(root: str) -> pd.DataFrame:
+    path = os.path.join(root, MEMBERS_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        return pd.DataFrame()
+
+
+_tables = TTLCache(ttl=3600, max_entries=1)
+
+
+def _load_tables() -> Optional[dict]:
+    stats_path = os.path.join(INDUSTRY_DIR, STATS_FILE)
+    members = _read_members(INDUSTRY_DIR)
+    if members.empty or not os.path.exists(stats_path):
+        return None
+    stats = pd.read_parquet(stats_path)
+    # 代码→行业、行业→统计值 两级字典，查询为O(1)
+    return {
+        'industry_of': dict(zip(members['代码'].astype(str), members['行业'])),
+        'stats': {row['行业']: row for row in stats.to_dict('records')},
+    }
+
+
+def get_industry_stats(code: str) -> Optional[Dict]:
+    """某只股票所属行业的汇总指标，行业汇总表未构建或找不到该股票时返回None"""
+    tables = _tables.get_or_load('tables', lambda: _load_tables() or {},
+                                 should_cache=lambda tables: bool(tables))
+    if not tables:
+        return None
+    industry = tables['industry_of'].get(code)
+    if industry is None:
+        return None
+    return tables['stats'].get(industry)
+
+
+def benchmark(stats: Optional[Dict], metric: str) -> float:
+    """行业基准值：优先使用行业中位数，缺失时回退为默认值"""
+    value = stats.get(f'{metric}_median') if stats else None
+    if value is None or pd.isna(value):
+        return DEFAULT_BENCHMARKS[metric]
+    return float(value)
+
+
+def percentile_band(value: float, stats: Optional[Dict], metric: str) -> str:
+    """根据行业分位数描述数值在行业中的位置"""
+    if not stats or pd.isna(value):
+        return "--"
+    p10, p25, p75, p90 = (stats.get(f'{metric}_p{p}') for p in PERCENTILES)
+    if any(v is None or pd.isna(v) for v in (p10, p25, p75, p90)):
+        return "--"
+    if value >= p90:
+        return "高于行业P90"
+    if value >= p75:
+        return "行业P75~P90"
+    if value >= p25:
+        return "行业P25~P75"
+    if value >= p10:
+        return "行业P10~P25"
+    return "低于行业P10"
+
+
+if __name__ == "__main__":
+    # 用法：python -m tools.industry_table   （建议每日收盘后或财报季定期运行）
+    started = time.perf_counter()
+    result = build_industry_table()
+    print(f"已统计 {len(result)} 个行业、{int(result['公司数'].sum())} 家公司，耗时 {time.perf_counter() - started:.1f} 秒")
@@ -0,0 +1,238 @@
+"""
+日线行情本地存储模块
+按 市场/复权方式/股票代码 将日线数据持久化为Parquet文件，只增量拉取上次存储之后缺失的交易日
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Optional
+
+import pandas as pd
+
+from .data_cache import CACHE_DIR, SPOT_CACHE_TTL, TTLCache, get_market_table
+from .datasource import ak
+
+
+OHLCV_STORE_DIR = os.getenv("OHLCV_STORE_DIR", os.path.join(CACHE_DIR, "ohlcv"))
+
+# 收盘后当日K线才视为最终数据并落盘（本地时间）
+MARKET_CLOSE = {
+    "a": dtime(15, 30),
+    "hk": dtime(16, 30),
+}
+
+# 前复权价格在除权除息后会整体变化，增量拉取时用重叠的最后一根K线校验
+_ADJUST_TOLERANCE = 1e-4
+
+
+def _to_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).replace('-', ''), '%Y%m%d').date()
+
+
+def _fmt(d: date) -> str:
+    return d.strftime('%Y%m%d')
+
+
+def last_final_date(market: str = "a") -> date:
+    """最后一个已收盘（K线不再变化）的自然日"""
+    now = datetime.now()
+    if now.time() >= MARKET_CLOSE[market]:
+        return now.date()
+    return now.date() - timedelta(days=1)
+
+
+def last_trading_day(on: Optional[date] = None) -> date:
+    """不晚于 on（默认今天）的最后一个A股交易日；交易日历获取失败时只跳过周末"""
+    on = on or datetime.now().date()
+    try:
+        calendar = get_market_table("tool_trade_date_hist_sina")
+        days = [d for d in pd.to_datetime(calendar["trade_date"]).dt.date if d <= on]
+        if days:
+            return max(days)
+    except Exception:
+        pass
+    while on.weekday() >= 5:
+        on -= timedelta(days=1)
+    return on
+
+
+class OHLCVStore:
+    """日线数据的本地列式存储，所有时间窗口请求均由本地数据响应"""
+
+    def __init__(self, root: str = OHLCV_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._key_locks: dict = {}
+        self._frames = TTLCache(ttl=24 * 3600, max_entries=512)
+        # 盘中未收盘的当日K线只在内存中短期缓存，不落盘
+        self._live = TTLCache(ttl=SPOT_CACHE_TTL, max_entries=512)
+
+    def get_history(self, symbol: str, start_date: str, end_date: str,
+                    adjust: str = "qfq", market: str = "a") -> pd.DataFrame:
+        """返回 [start_date, end_date] 区间的日线数据，缺失部分从数据源增量补齐"""
+        if market not in MARKET_CLOSE:
+            raise ValueError(f"不支持的市场类型: {market}")
+        key = (market, adjust or "none", symbol)
+        start_d, end_d = _to_date(start_date), _to_date(end_date)
+        final_end = min(end_d, self._last_final_date(market))
+
+        with self._lock_for(key):
+            df, meta = self._load(key)
+            df, meta = self._sync(key, df, meta, start_d, final_end)
+
+        if end_d > final_end:
+            live = self._live.get_or_load(
+                key,
+                lambda: self._fetch(market, symbol, final_end + timedelta(days=1), end_d, adjust),
+            )
+            if not live.empty:
+                df = self._merge(df, live)
+
+        if df.empty:
+            return df.copy()
+        mask = (df['日期'] >= start_d.isoformat()) & (df['日期'] <= end_d.isoformat())
+        return df[mask].reset_index(drop=True)
+
+    def _sync(self, key, df: pd.DataFrame, meta: dict, start_d: date, final_end: date):
+        """补齐本地存储中 [start_d, final_end] 区间缺失的已收盘K线"""
+        market, adjust, symbol = key
+        adjust = "" if adjust == "none" else adjust
+        if start_d > final_end:
+            return df, meta
+
+        # 空结果可能是接口抖动或停牌，不落盘也不扩大覆盖区间，下次请求时重新拉取
+        if not meta:
+            df = self._fetch(market, symbol, start_d, final_end, adjust)
+            if df.empty:
+                return df, meta
+            meta = {"covered_from": start_d.isoformat(), "covered_to": final_end.isoformat()}
+            self._save(key, df, meta)
+            return df, meta
+
+        meta = dict(meta)
+        changed = False
+        covered_from = _to_date(meta["covered_from"])
+        covered_to = _to_date(meta["covered_to"])
+
+        if start_d < covered_from:
+            older = self._fetch(market, symbol, start_d, covered_from - timedelta(days=1), adjust)
+            # 已有数据时更早区间为空说明尚未上市，同样记为已覆盖，避免每次重复拉取
+            df = self._merge(older, df)
+            meta["covered_from"] = start_d.isoformat()
+            changed = True
+
+        if final_end > covered_to:
+            # 从最后一根已存K线开始拉取，用重叠部分检测复权价格是否发生变化
+            overlap_from = _to_date(df['日期'].iloc[-1]) if not df.empty else covered_to + timedelta(days=1)
+            newer = self._fetch(market, symbol, overlap_from, final_end, adjust)
+            if adjust and not df.empty and not self._overlap_consistent(df, newer):
+                refetched = self._fetch(market, symbol, _to_date(meta["covered_from"]), final_end, adjust)
+                if not refetched.empty:
+                    df = refetched
+                    meta["covered_to"] = final_end.isoformat()
+                    changed = True
+            elif not newer.empty:
+                df = self._merge(df, newer)
+                meta["covered_to"] = final_end.isoformat()
+                changed = True
+
+        if changed and not df.empty:
+            self._save(key, df, meta)
+        return df, meta
+
+    @staticmethod
+    def _overlap_consistent(stored: pd.DataFrame, fetched: pd.DataFrame) -> bool:
+        if fetched.empty:
+            return True
+        last = stored.iloc[-1]
+        same_day = fetched[fetched['日期'] == last['日期']]
+        if same_day.empty:
+            return True
+        return abs(float(same_day.iloc[0]['收盘']) - float(last['收盘'])) <= _ADJUST_TOLERANCE * max(abs(float(last['收盘'])), 1.0)
+
+    @staticmethod
+    def _fetch(market: str, symbol: str, start_d: date, end_d: date, adjust: str) -> pd.DataFrame:
+        if start_d > end_d:
+            return pd.DataFrame()
+        fetcher = ak.stock_zh_a_hist if market == "a" else ak.stock_hk_hist
+        df = fetcher(symbol=symbol, period="daily",
+                     start_date=_fmt(start_d), end_date=_fmt(end_d),
+                     adjust=adjust)
+        if df is None or df.empty:
+            return pd.DataFrame()
+        df = df.copy()
+        df['日期'] = pd.to_datetime(df['日期']).dt.strftime('%Y-%m-%d')
+        return df
+
+    @staticmethod
+    def _merge(older: pd.DataFrame, newer: pd.DataFrame) -> pd.DataFrame:
+        if older.empty:
+            return newer.reset_index(drop=True)
+        if newer.empty:
+            return older
+        merged = pd.concat([older, newer], ignore_index=True)
+        merged = merged.drop_duplicates(subset='日期', keep='last')
+        return merged.sort_values('日期').reset_index(drop=True)
+
+    @staticmethod
+    def _last_final_date(market: str) -> date:
+        return last_final_date(market)
+
+    def _paths(self, key):
+        market, adjust, symbol = key
+        base = os.path.join(self.root, market, adjust)
+        return os.path.join(base, f"{symbol}.parquet"), os.path.join(base, f"{symbol}.json")
+
+    def _load(self, key):
+        cached = self._frames.get(key)
+        if cached is not None:
+            return cached
+        data_path, meta_path = self._paths(key)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return pd.DataFrame(), {}
+        try:
+            df = pd.read_parquet(data_path)
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except Exception:
+            # 文件损坏时重新拉取
+            return pd.DataFrame(), {}
+        self._frames.set(key, (df, meta))
+        return df, meta
+
+    def _save(self, key, df: pd.DataFrame, meta: dict) -> None:
+        data_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        # 先写临时文件再原子替换，避免多进程读到半写入的文件
+        tmp_path = f"{data_path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, data_path)
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+        self._frames.set(key, (df, dict(meta)))
+
+    def _lock_for(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+
+_store = OHLCVStore()
+
+
+def get_store() -> OHLCVStore:
+    """获取进程内共享的日线存储"""
+    return _store
+
+
+def get_daily_history(symbol: str, days: int, adjust: str = "qfq", market: str = "a") -> pd.DataFrame:
+    """获取最近 days 个自然日的日线数据"""
+    end = datetime.now()
+    start = end - timedelta(days=days)
+    return get_store().get_history(symbol, _fmt(start.date()), _fmt(end.date()),
+                                   adjust=adjust, market=market)
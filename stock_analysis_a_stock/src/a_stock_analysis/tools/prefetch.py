@@ -0,0 +1,102 @@
+"""
+数据预取模块
+根据 tasks.yaml 中各任务声明的 data_requirements，在crew启动前用线程池并行拉取所需数据，
+预热各工具共享的缓存，使Agent的工具调用直接命中缓存
+"""
+
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .data_cache import get_market_table, get_spot_snapshot
+from .financial_cache import get_financial_indicator
+from .indicator_engine import get_precomputed_indicators
+from .indicator_state import get_indicator_snapshot
+from .ohlcv_store import get_daily_history
+
+
+# 预取线程数与整体等待时间（秒），超时的数据由工具调用时再拉取
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "8"))
+PREFETCH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT", "60"))
+
+DATA_KINDS = ("quote", "daily", "financial", "flow", "sector", "news")
+
+
+def _warm_daily(code: str, market: str) -> None:
+    if market == "a":
+        # 技术情绪分析优先读预计算指标表，缺失时使用增量指标状态（回看期更长，先拉取）
+        if get_precomputed_indicators(code) is None:
+            get_indicator_snapshot(code)
+    get_daily_history(code, days=30, adjust="qfq", market=market)
+
+
+def _jobs_for(kind: str, code: str, market: str) -> List[Tuple[str, Callable[[], object]]]:
+    """某类数据对应的预取任务，返回 (任务标识, 拉取函数) 列表；任务标识相同的只执行一次"""
+    if kind == "quote":
+        source = "stock_zh_a_spot" if market == "a" else "stock_hk_spot"
+        return [(f"spot:{source}", lambda: get_spot_snapshot(source))]
+    if kind == "daily":
+        return [(f"daily:{market}:{code}", lambda: _warm_daily(code, market))]
+    if kind == "financial":
+        # 港股财务数据暂无缓存，预取无意义
+        if market != "a":
+            return []
+        return [(f"financial:{code}", lambda: get_financial_indicator(code))]
+    if kind == "flow":
+        return [
+            ("table:stock_hsgt_north_net_flow_in", lambda: get_market_table("stock_hsgt_north_net_flow_in")),
+            ("table:stock_sector_fund_flow_rank", lambda: get_market_table("stock_sector_fund_flow_rank")),
+            ("spot:stock_zh_a_spot", lambda: get_spot_snapshot("stock_zh_a_spot")),
+        ]
+    if kind == "sector":
+        return [("table:stock_sector_spot", lambda: get_market_table("stock_sector_spot"))]
+    if kind == "news":
+        return [
+            ("table:stock_news_em", lambda: get_market_table("stock_news_em")),
+            ("table:stock_news_jrj", lambda: get_market_table("stock_news_jrj")),
+        ]
+    raise ValueError(f"不支持的数据类型: {kind}，可选：{', '.join(DATA_KINDS)}")
+
+
+def plan(tasks_config: Dict[str, dict], stock_code: str,
+         task_names: Iterable[str] = None) -> Dict[str, Callable[[], object]]:
+    """汇总各任务声明的 data_requirements，生成去重后的预取任务"""
+    code, _, suffix = stock_code.upper().partition('.')
+    market = "hk" if suffix == "HK" else "a"
+    jobs: Dict[str, Callable[[], object]] = {}
+    for name in task_names or tasks_config:
+        for kind in tasks_config.get(name, {}).get("data_requirements") or ():
+            for key, fetch in _jobs_for(kind, code, market):
+                jobs.setdefault(key, fetch)
+    return jobs
+
+
+def prefetch(tasks_config: Dict[str, dict], inputs: dict,
+             concurrency: int = PREFETCH_CONCURRENCY, timeout: float = PREFETCH_TIMEOUT) -> Dict[str, str]:
+    """
+    并行执行预取任务，耗时约等于最慢的单个数据源。
+    预取失败不影响后续分析，返回 {任务标识: 状态} 便于排查。
+    """
+    jobs = plan(tasks_config, inputs["stock_code"])
+    if not jobs:
+        return {}
+
+    status: Dict[str, str] = {}
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs))))
+    # 预取在调用方的上下文中执行，沿用其追踪span与时限
+    futures = {executor.submit(contextvars.copy_context().run, fetch): key for key, fetch in jobs.items()}
+    done, not_done = wait(futures, timeout=timeout)
+    for future in done:
+        error = future.exception()
+        status[futures[future]] = "ok" if error is None else f"失败: {error}"
+    for future in not_done:
+        status[futures[future]] = "超时"
+    # 超时的任务在后台继续执行，完成后同样写入缓存
+    executor.shutdown(wait=False)
+
+    ok = sum(1 for s in status.values() if s == "ok")
+    print(f"数据预取完成：{ok}/{len(jobs)} 项成功，耗时 {time.perf_counter() - started:.2f} 秒")
+    return status
@@ -0,0 +1,225 @@
+"""
+数据源限流模块
+按接口对akshare调用做令牌桶限速和并发数限制，配置见 config/rate_limits.yaml。
+默认在进程内计数；RATE_LIMIT_BACKEND=sqlite 时通过本地SQLite文件计数，同一台机器上的多个进程（如多个crew worker）共享同一份额度
+"""
+
+import fnmatch
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import yaml
+
+from .concurrency import DeadlineExceeded, _timed_out, remaining
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# memory（进程内）/ sqlite（跨进程共享）
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_BACKENDS = ("memory", "sqlite")
+
+RATE_LIMIT_CONFIG = os.getenv(
+    "RATE_LIMIT_CONFIG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "rate_limits.yaml"),
+)
+
+# sqlite模式的计数文件，留空时为 $A_STOCK_CACHE_DIR/rate_limit.sqlite
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "")
+
+# sqlite模式下并发名额的租期（秒）：持有名额的进程异常退出后，超过租期的名额自动失效
+SLOT_LEASE_SECONDS = 300
+# sqlite模式下等待并发名额时的轮询间隔（秒）
+SLOT_POLL_SECONDS = 0.05
+
+DEFAULT_LIMIT = {"rate": 10.0, "burst": 20.0, "concurrency": 8}
+
+
+def load_limits(path: str = RATE_LIMIT_CONFIG) -> dict:
+    """读取限流配置；文件不存在时所有接口使用内置默认值"""
+    config = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+    default = {**DEFAULT_LIMIT, **(config.get("default") or {})}
+    endpoints = {str(name): {**default, **(limit or {})} for name, limit in (config.get("endpoints") or {}).items()}
+    return {"default": default, "endpoints": endpoints}
+
+
+def _over_budget(endpoint: str, wait: str) -> DeadlineExceeded:
+    return _timed_out(DeadlineExceeded(f"工具调用时限已用尽，放弃等待 {endpoint} 的{wait}（超时）"))
+
+
+class RateLimiter:
+    """
+    进程内限流：每个额度一个令牌桶和一个信号量。
+    令牌不足时预约下一个令牌并等待，先到的请求先拿到令牌。
+    在工具调用的时限内（见 concurrency.deadline）等待不超过剩余预算，预计超出时抛出 DeadlineExceeded
+    """
+
+    def __init__(self, limits: Optional[dict] = None):
+        limits = limits or load_limits()
+        self.default = limits["default"]
+        self.endpoints = limits["endpoints"]
+        self._patterns = [name for name in self.endpoints if any(c in name for c in "*?[")]
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, tuple] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+    def resolve(self, endpoint: str):
+        """返回 (额度名, 限流参数)：精确接口名优先，其次按配置顺序匹配通配符，否则为该接口单独的默认额度"""
+        if endpoint in self.endpoints:
+            return endpoint, self.endpoints[endpoint]
+        for pattern in self._patterns:
+            if fnmatch.fnmatchcase(endpoint, pattern):
+                return pattern, self.endpoints[pattern]
+        return endpoint, self.default
+
+    def _reserve(self, key: str, rate: float, burst: float) -> float:
+        """取一个令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate) - 1
+            self._buckets[key] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def _refund(self, key: str) -> None:
+        """归还预约后未使用的令牌"""
+        with self._lock:
+            tokens, updated = self._buckets[key]
+            self._buckets[key] = (tokens + 1, updated)
+
+    def _acquire_slot(self, key: str, concurrency: int, timeout: Optional[float] = None):
+        """取得并发名额；timeout 秒内未取得时返回 None"""
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = self._semaphores[key] = threading.BoundedSemaphore(concurrency)
+        if timeout is None:
+            semaphore.acquire()
+        elif not semaphore.acquire(timeout=max(timeout, 0)):
+            return None
+        return semaphore
+
+    def _release_slot(self, key: str, slot) -> None:
+        slot.release()
+
+    @contextmanager
+    def slot(self, endpoint: str):
+        """在限速和并发限制内执行一次请求，返回本次排队等待的秒数"""
+        key, limit = self.resolve(endpoint)
+        started = time.monotonic()
+        slot = None
+        if int(limit["concurrency"]) > 0:
+            slot = self._acquire_slot(key, int(limit["concurrency"]), remaining())
+            if slot is None:
+                raise _over_budget(endpoint, "并发名额")
+        try:
+            if float(limit["rate"]) > 0:
+                delay = self._reserve(key, float(limit["rate"]), max(float(limit["burst"]), 1.0))
+                left = remaining()
+                if left is not None and delay > left:
+                    self._refund(key)
+                    raise _over_budget(endpoint, "限速令牌")
+                if delay > 0:
+                    time.sleep(delay)
+            yield time.monotonic() - started
+        finally:
+            if slot is not None:
+                self._release_slot(key, slot)
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """跨进程限流：令牌桶状态和并发名额保存在SQLite文件中，在写事务内更新"""
+
+    def __init__(self, path: str, limits: Optional[dict] = None):
+        super().__init__(limits)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS slots ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, pid INTEGER NOT NULL, acquired_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_slots_name ON slots(name)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _reserve(self, key: str, rate: float, burst: float) -> float:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(now - updated, 0) * rate) - 1
+            conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def _refund(self, key: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE buckets SET tokens = tokens + 1 WHERE name = ?", (key,))
+        finally:
+            conn.close()
+
+    def _acquire_slot(self, key: str, concurrency: int, timeout: Optional[float] = None):
+        expires = None if timeout is None else time.monotonic() + timeout
+        while True:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                now = time.time()
+                conn.execute("DELETE FROM slots WHERE acquired_at < ?", (now - SLOT_LEASE_SECONDS,))
+                held = conn.execute("SELECT COUNT(*) FROM slots WHERE name = ?", (key,)).fetchone()[0]
+                slot_id = None
+                if held < concurrency:
+                    slot_id = conn.execute("INSERT INTO slots (name, pid, acquired_at) VALUES (?, ?, ?)",
+                                           (key, os.getpid(), now)).lastrowid
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+            if slot_id is not None:
+                return slot_id
+            if expires is not None and time.monotonic() + SLOT_POLL_SECONDS > expires:
+                return None
+            time.sleep(SLOT_POLL_SECONDS)
+
+    def _release_slot(self, key: str, slot) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM slots WHERE id = ?", (slot,))
+        finally:
+            conn.close()
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> Optional[RateLimiter]:
+    """返回当前配置的限流器，RATE_LIMIT_ENABLED=false 时返回 None"""
+    global _limiter
+    if not RATE_LIMIT_ENABLED:
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            if RATE_LIMIT_BACKEND not in RATE_LIMIT_BACKENDS:
+                raise ValueError(f"不支持的限流后端: {RATE_LIMIT_BACKEND}，可选：{', '.join(RATE_LIMIT_BACKENDS)}")
+            if RATE_LIMIT_BACKEND == "sqlite":
+                from .data_cache import CACHE_DIR
+                _limiter = SQLiteRateLimiter(RATE_LIMIT_DB or os.path.join(CACHE_DIR, "rate_limit.sqlite"))
+            else:
+                _limiter = RateLimiter()
+    return _limiter
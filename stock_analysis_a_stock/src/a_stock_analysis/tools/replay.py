@@ -0,0 +1,136 @@
+"""
+录制/回放模块
+record 模式下把每次数据源调用的返回值保存为本地fixture，replay 模式下直接读取fixture返回，
+可注入固定或录制时的延迟，使完整的crew运行和基准测试在离线机器上可复现
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+# off（直连数据源）/ record（调用数据源并录制）/ replay（只读fixture，不访问网络）
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off").lower()
+REPLAY_MODES = ("off", "record", "replay")
+
+# fixture目录，留空时为 $A_STOCK_CACHE_DIR/fixtures
+REPLAY_FIXTURE_DIR = os.getenv("REPLAY_FIXTURE_DIR", "")
+
+# 回放时注入的延迟：毫秒数，或 recorded 表示按录制时的实际耗时
+REPLAY_LATENCY_MS = os.getenv("REPLAY_LATENCY_MS", "0")
+
+# 随运行日期变化的参数；精确匹配不到时忽略这些参数，使用同一接口最近一次的录制
+DATE_ARGS = ("start_date", "end_date", "date", "trade_date")
+
+
+class FixtureNotFoundError(LookupError):
+    """回放模式下找不到对应调用的fixture"""
+
+
+def _digest(payload: Any) -> str:
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+class FixtureStore:
+    """
+    按 (接口名, 参数) 保存调用结果：<目录>/<接口名>/<参数摘要>.pkl，旁边的 .json 记录参数与耗时；
+    latest-<摘要>.json 记录忽略日期参数后最近一次录制对应的精确键
+    """
+
+    def __init__(self, root: str, mode: str = REPLAY_MODE, latency_ms: str = REPLAY_LATENCY_MS):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"不支持的回放模式: {mode}，可选：{', '.join(REPLAY_MODES)}")
+        self.root = root
+        self.mode = mode
+        self.latency_ms = latency_ms
+
+    @staticmethod
+    def keys(args: tuple, kwargs: dict):
+        """精确键与忽略日期参数后的宽松键"""
+        exact = _digest({"args": list(args), "kwargs": kwargs})
+        loose = _digest({"args": list(args), "kwargs": {k: v for k, v in kwargs.items() if k not in DATE_ARGS}})
+        return exact, f"latest-{loose}"
+
+    def call(self, endpoint: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        """按当前模式执行一次数据源调用"""
+        if self.mode == "off":
+            return func(*args, **kwargs)
+        exact, loose = self.keys(args, kwargs)
+        if self.mode == "replay":
+            return self._replay(endpoint, exact, loose)
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        meta = {
+            "endpoint": endpoint,
+            "args": list(args),
+            "kwargs": kwargs,
+            "recorded_at": time.time(),
+            "duration": time.perf_counter() - started,
+        }
+        self._save(endpoint, exact, result, meta)
+        self._write_json(os.path.join(self.root, endpoint, f"{loose}.json"), {"key": exact})
+        return result
+
+    def _paths(self, endpoint: str, key: str):
+        base = os.path.join(self.root, endpoint, key)
+        return f"{base}.pkl", f"{base}.json"
+
+    def _replay(self, endpoint: str, exact: str, loose: str) -> Any:
+        data_path, meta_path = self._paths(endpoint, exact)
+        if not os.path.exists(data_path):
+            # 宽松键指向同一接口、同一非日期参数最近一次录制的精确键
+            try:
+                with open(os.path.join(self.root, endpoint, f"{loose}.json"), "r", encoding="utf-8") as f:
+                    data_path, meta_path = self._paths(endpoint, json.load(f)["key"])
+            except (OSError, ValueError, KeyError):
+                pass
+        if not os.path.exists(data_path):
+            raise FixtureNotFoundError(f"未录制的调用: {endpoint}（{exact}），请先以 REPLAY_MODE=record 运行")
+        with open(data_path, "rb") as f:
+            result = pickle.load(f)
+        self._sleep(meta_path)
+        return result
+
+    def _sleep(self, meta_path: str) -> None:
+        if self.latency_ms == "recorded":
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    time.sleep(json.load(f).get("duration", 0))
+            except (OSError, ValueError):
+                pass
+            return
+        delay = float(self.latency_ms or 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _save(self, endpoint: str, key: str, result: Any, meta: dict) -> None:
+        data_path, meta_path = self._paths(endpoint, key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f)
+        os.replace(tmp_path, data_path)
+        self._write_json(meta_path, meta)
+
+    @staticmethod
+    def _write_json(path: str, data: dict) -> None:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+
+_store: Optional[FixtureStore] = None
+
+
+def get_fixture_store() -> FixtureStore:
+    global _store
+    if _store is None:
+        from .data_cache import CACHE_DIR
+        _store = FixtureStore(REPLAY_FIXTURE_DIR or os.path.join(CACHE_DIR, "fixtures"))
+    return _store
@@ -0,0 +1,264 @@
+"""
+数据源注册表
+按接口记录最近调用的耗时与失败情况：连续失败的接口熔断一段时间，熔断期间直接抛出 CircuitOpenError 而不再请求；
+有主备数据源的调用按观测到的p95耗时排序，先请求当前最快且可用的数据源。
+只有传输层错误（超时、连接错误、HTTP 5xx）计为接口失败；个别股票没有数据等引起的解析错误
+（如空表导致的 KeyError）说明接口本身可用，不计入熔断
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .concurrency import SOURCE_TIMEOUT
+from .tracing import current_run_id
+
+
+# 连续失败达到该次数后熔断；熔断持续的秒数，之后放行一次试探请求（半开），成功则恢复
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "60"))
+
+# 每个接口保留的最近调用数，用于计算p95耗时与错误率
+SOURCE_STATS_WINDOW = int(os.getenv("SOURCE_STATS_WINDOW", "100"))
+
+# 熔断状态
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """接口处于熔断期，未发起请求"""
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """是否为接口不可用引起的错误：超时、连接错误或HTTP 5xx；其余异常视为该次请求的数据问题"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # akshare 通过 requests 请求接口；未导入 requests 时不可能出现其异常
+    requests = sys.modules.get("requests")
+    if requests is None:
+        return False
+    exceptions = requests.exceptions
+    if isinstance(error, (exceptions.ConnectionError, exceptions.Timeout, exceptions.ChunkedEncodingError)):
+        return True
+    if isinstance(error, exceptions.HTTPError):
+        status = getattr(error.response, "status_code", None)
+        return status is None or status >= 500
+    return False
+
+
+class EndpointStats:
+    """单个接口的调用统计与熔断状态，由 SourceRegistry 加锁访问"""
+
+    def __init__(self, window: int):
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.last_error: Optional[str] = None
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(math.ceil(len(ordered) * 0.95), len(ordered)) - 1]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class SourceRegistry:
+    """
+    按接口名统计调用并实现熔断：
+    - 连续 failure_threshold 次传输层失败（含超过 slow_after 秒才返回的调用）后熔断 open_seconds 秒，
+      其他异常（见 is_transport_error）照常抛出，但不计为失败；
+    - 熔断期满后只放行一次试探请求，成功则恢复，失败则重新熔断。
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 open_seconds: float = CIRCUIT_OPEN_SECONDS, window: int = SOURCE_STATS_WINDOW,
+                 slow_after: Optional[float] = SOURCE_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.window = window
+        self.slow_after = slow_after
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EndpointStats] = {}
+        # 按运行ID分别计数（调用、失败、熔断拒绝），并发运行的多个crew各自汇总；熔断状态与耗时分布为进程共享
+        self._run_counts: Dict[str, Dict[str, Counter]] = {}
+
+    def _count(self, endpoint: str, **deltas: int) -> None:
+        """在当前运行下累加计数，调用方需持有锁"""
+        run_id = current_run_id()
+        if run_id is not None:
+            self._run_counts.setdefault(run_id, {}).setdefault(endpoint, Counter()).update(deltas)
+
+    def _get(self, endpoint: str) -> EndpointStats:
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = EndpointStats(self.window)
+        return stats
+
+    def state(self, endpoint: str) -> str:
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                return CLOSED
+            if stats.state == OPEN and time.monotonic() - stats.opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return stats.state
+
+    def available(self, endpoint: str) -> bool:
+        """接口当前是否会被放行（未熔断，或熔断期满等待试探）"""
+        return self.state(endpoint) != OPEN
+
+    def _acquire(self, endpoint: str) -> bool:
+        """请求前检查熔断状态；返回本次是否为半开状态下的试探请求"""
+        with self._lock:
+            stats = self._get(endpoint)
+            if stats.state == CLOSED or self.failure_threshold <= 0:
+                return False
+            if stats.state == OPEN and time.monotonic() - stats.opened_at >= self.open_seconds:
+                stats.state = HALF_OPEN
+            if stats.state == HALF_OPEN and not stats.probing:
+                stats.probing = True
+                return True
+            stats.rejected += 1
+            self._count(endpoint, rejected=1)
+            remaining = max(self.open_seconds - (time.monotonic() - stats.opened_at), 0)
+            raise CircuitOpenError(
+                f"数据源 {endpoint} 已熔断（连续失败{stats.consecutive_failures}次，"
+                f"最近错误：{stats.last_error}），约{remaining:.0f}秒后重试"
+            )
+
+    def _record(self, endpoint: str, duration: Optional[float], error: Optional[str], probe: bool) -> None:
+        with self._lock:
+            stats = self._get(endpoint)
+            stats.calls += 1
+            self._count(endpoint, calls=1, failures=int(error is not None))
+            # 抛出异常的调用往往很快返回，不计入耗时分布，以免失败的接口显得更快
+            if duration is not None:
+                stats.latencies.append(duration)
+            if probe:
+                stats.probing = False
+            if error is None:
+                stats.outcomes.append(1)
+                stats.consecutive_failures = 0
+                stats.state = CLOSED
+                return
+            stats.outcomes.append(0)
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            stats.last_error = error
+            if probe or (self.failure_threshold > 0 and stats.consecutive_failures >= self.failure_threshold):
+                stats.state = OPEN
+                stats.opened_at = time.monotonic()
+
+    def call(self, endpoint: str, func: Callable[[], Any]) -> Any:
+        """经过熔断检查调用接口并记录耗时与结果；熔断期间抛出 CircuitOpenError"""
+        probe = self._acquire(endpoint)
+        started = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            if is_transport_error(e):
+                self._record(endpoint, None, f"{type(e).__name__}: {e}", probe)
+            else:
+                # 接口已正常响应，只是该次请求的数据有问题：按成功调用记录，不影响熔断
+                self._record(endpoint, time.perf_counter() - started, None, probe)
+            raise
+        except BaseException:
+            # 中断等非请求错误不计入统计，但要释放试探名额
+            if probe:
+                with self._lock:
+                    self._get(endpoint).probing = False
+            raise
+        duration = time.perf_counter() - started
+        slow = self.slow_after is not None and duration > self.slow_after
+        self._record(endpoint, duration, f"响应超过{self.slow_after:g}秒" if slow else None, probe)
+        return result
+
+    def rank(self, endpoints: Sequence[str]) -> List[str]:
+        """
+        按可用性与p95耗时排序：熔断中的接口排在最后，其余按p95从小到大；
+        尚无统计的接口视为与最快的接口相当，保持传入的先后顺序
+        """
+        with self._lock:
+            now = time.monotonic()
+            keys = []
+            for position, endpoint in enumerate(endpoints):
+                stats = self._stats.get(endpoint)
+                if stats is None:
+                    keys.append((0, 0.0, position))
+                    continue
+                is_open = stats.state == OPEN and now - stats.opened_at < self.open_seconds
+                p95 = stats.p95()
+                keys.append((int(is_open), 0.0 if p95 is None else p95, position))
+        return [endpoint for _, endpoint in sorted(zip(keys, endpoints), key=lambda item: item[0])]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            names = list(self._stats)
+        result = {}
+        for endpoint in names:
+            state = self.state(endpoint)
+            with self._lock:
+                stats = self._stats.get(endpoint)
+                if stats is None:
+                    continue
+                p95 = stats.p95()
+                result[endpoint] = {
+                    "state": state,
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                    "rejected": stats.rejected,
+                    "error_rate": round(stats.error_rate(), 3),
+                    "p95_seconds": None if p95 is None else round(p95, 3),
+                    "last_error": stats.last_error,
+                }
+        return result
+
+    def summary(self, run_id: Optional[str] = None) -> str:
+        """列出出现过失败或被熔断拒绝的接口；默认只统计当前运行的调用，不在运行中时统计全部"""
+        run_id = run_id or current_run_id()
+        stats = self.stats()
+        if run_id:
+            with self._lock:
+                counts = {endpoint: dict(c) for endpoint, c in self._run_counts.get(run_id, {}).items()}
+            stats = {endpoint: {**stats[endpoint], "calls": c.get("calls", 0), "failures": c.get("failures", 0),
+                                "rejected": c.get("rejected", 0)}
+                     for endpoint, c in counts.items() if endpoint in stats}
+        lines = []
+        for endpoint, item in sorted(stats.items()):
+            if not item["failures"] and not item["rejected"]:
+                continue
+            p95 = "--" if item["p95_seconds"] is None else f"{item['p95_seconds']:.2f}s"
+            lines.append(f"  {endpoint}：{item['state']}，失败 {item['failures']}/{item['calls']} 次，"
+                         f"熔断拒绝 {item['rejected']} 次，p95 {p95}")
+        return "数据源异常：\n" + "\n".join(lines) if lines else ""
+
+    def discard(self, run_id: Optional[str] = None) -> None:
+        """丢弃某次运行（默认当前运行）的计数"""
+        with self._lock:
+            self._run_counts.pop(run_id or current_run_id(), None)
+
+    def reset(self, endpoint: Optional[str] = None) -> None:
+        with self._lock:
+            if endpoint is None:
+                self._stats.clear()
+                self._run_counts.clear()
+            else:
+                self._stats.pop(endpoint, None)
+
+
+registry = SourceRegistry()
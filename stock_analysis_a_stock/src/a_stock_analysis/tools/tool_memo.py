@@ -0,0 +1,142 @@
+"""
+工具结果记忆模块
+同一次kickoff内所有Agent共享工具调用结果：按 (工具, 规范化参数, 交易时段) 缓存，
+重复调用直接从内存返回，并统计命中/未命中次数
+"""
+
+import contextvars
+import functools
+import inspect
+import threading
+from collections import Counter
+from datetime import datetime, time as dtime
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .concurrency import track_timeouts
+from .tracing import annotate
+
+
+# A股交易时段划分（本地时间），同一时段内的行情视为不变
+SESSIONS = (
+    (dtime(9, 30), "pre"),
+    (dtime(11, 30), "morning"),
+    (dtime(13, 0), "noon"),
+    (dtime(15, 0), "afternoon"),
+)
+
+# 当前工具调用是否只得到部分结果，见 mark_incomplete
+_incomplete: contextvars.ContextVar = contextvars.ContextVar("tool_incomplete", default=None)
+
+
+class ToolError(str):
+    """工具返回的错误信息：与普通文本一样返回给Agent，但不会被缓存，便于重试"""
+
+
+def mark_incomplete() -> None:
+    """工具的某个章节获取失败、仍返回其余部分时调用，本次结果不缓存"""
+    flags = _incomplete.get()
+    if flags is not None:
+        flags.append(True)
+
+
+def market_session(now: Optional[datetime] = None) -> str:
+    """当前所处的交易时段，如 2024-06-03:morning"""
+    now = now or datetime.now()
+    for end, name in SESSIONS:
+        if now.time() < end:
+            return f"{now.date().isoformat()}:{name}"
+    return f"{now.date().isoformat()}:closed"
+
+
+def _normalize(name: str, value: Any) -> Hashable:
+    if isinstance(value, str):
+        value = value.strip()
+        return value.upper() if name == "stock_code" else value
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(k, v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(name, v) for v in value)
+    return value
+
+
+class ToolMemo:
+    """线程安全的工具结果缓存，一个crew实例一份"""
+
+    def __init__(self):
+        self._results: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+        self._key_locks: dict = {}
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+
+    def key(self, tool_name: str, arguments: Dict[str, Any]) -> Hashable:
+        args = tuple(sorted((k, _normalize(k, v)) for k, v in arguments.items()))
+        return tool_name, args, market_session()
+
+    def get_or_call(self, tool_name: str, arguments: Dict[str, Any], call: Callable[[], Any]) -> Any:
+        """命中时直接返回；未命中时调用工具，同一参数的并发调用只执行一次"""
+        key = self.key(tool_name, arguments)
+        with self._lock:
+            if key in self._results:
+                self.hits[tool_name] += 1
+                annotate(cache="hit")
+                return self._results[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._results:
+                    self.hits[tool_name] += 1
+                    annotate(cache="hit")
+                    return self._results[key]
+                self.misses[tool_name] += 1
+                annotate(cache="miss")
+            # 返回 ToolError、调用中有数据请求超时或章节获取失败（结果不完整）时不缓存
+            token = _incomplete.set([])
+            try:
+                with track_timeouts() as timeouts:
+                    result = call()
+                incomplete = timeouts or _incomplete.get()
+            finally:
+                _incomplete.reset(token)
+            if not isinstance(result, ToolError) and not incomplete:
+                with self._lock:
+                    self._results[key] = result
+            return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._key_locks.clear()
+            self.hits.clear()
+            self.misses.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各工具的命中/未命中次数"""
+        with self._lock:
+            return {name: {"hits": self.hits[name], "misses": self.misses[name]}
+                    for name in sorted(set(self.hits) | set(self.misses))}
+
+    def summary(self) -> str:
+        stats = self.stats()
+        hits = sum(s["hits"] for s in stats.values())
+        total = hits + sum(s["misses"] for s in stats.values())
+        lines = [f"工具调用 {total} 次，命中缓存 {hits} 次"]
+        lines += [f"  {name}：命中 {s['hits']} / 未命中 {s['misses']}" for name, s in stats.items()]
+        return "\n".join(lines)
+
+
+def memoized(run: Callable) -> Callable:
+    """装饰工具的 _run 方法：工具实例设置了 memo 时经由 ToolMemo 调用"""
+    signature = inspect.signature(run)
+
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        memo = getattr(self, "memo", None)
+        if memo is None:
+            return run(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = {k: v for k, v in bound.arguments.items() if k != "self"}
+        return memo.get_or_call(self.name, arguments, lambda: run(self, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,226 @@
+"""
+全市场日线矩阵模块
+将全部A股日线数据按字段存为 日期×股票 的内存映射NumPy数组，多进程可零拷贝共享
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import CACHE_DIR, get_spot_snapshot
+from .ohlcv_store import get_store, last_final_date, last_trading_day
+
+
+UNIVERSE_DIR = os.getenv("UNIVERSE_DIR", os.path.join(CACHE_DIR, "universe"))
+
+FIELDS = ("open", "high", "low", "close", "volume")
+DTYPE = np.float64
+
+# 日线数据列名（stock_zh_a_hist）与全市场快照列名（stock_zh_a_spot_em）到字段的映射
+HIST_COLUMNS = {"open": "开盘", "high": "最高", "low": "最低", "close": "收盘", "volume": "成交量"}
+SPOT_COLUMNS = {"open": "今开", "high": "最高", "low": "最低", "close": "最新价", "volume": "成交量"}
+
+INDEX_FILE = "index.json"
+
+
+class UniverseMatrix:
+    """
+    日期×股票的只读内存映射矩阵，每个字段一个数组，缺失值为NaN。
+    symbols/dates 索引保存在 index.json 中，数据文件按代际（generation）命名，
+    重建时写入新代际文件后再原子替换索引，已打开的读者不受影响。
+    写入（build/append）只允许单个进程执行。
+    """
+
+    def __init__(self, root: str, index: dict):
+        self.root = root
+        self.generation = index["generation"]
+        self.adjust = index.get("adjust", "qfq")
+        self.symbols: List[str] = index["symbols"]
+        self.dates: List[str] = index["dates"]
+        self.symbol_pos: Dict[str, int] = {s: i for i, s in enumerate(self.symbols)}
+        self.date_pos: Dict[str, int] = {d: i for i, d in enumerate(self.dates)}
+        shape = (len(self.dates), len(self.symbols))
+        self._arrays = {
+            field: np.memmap(self._data_path(root, field, self.generation), dtype=DTYPE, mode="r", shape=shape)
+            if shape[0] and shape[1] else np.empty(shape, dtype=DTYPE)
+            for field in FIELDS
+        }
+
+    @classmethod
+    def open(cls, adjust: str = "qfq", root: Optional[str] = None) -> "UniverseMatrix":
+        """打开已构建的矩阵"""
+        root = root or os.path.join(UNIVERSE_DIR, adjust or "none")
+        with open(os.path.join(root, INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        return cls(root, index)
+
+    def field(self, name: str) -> np.ndarray:
+        """返回某个字段的 日期×股票 矩阵（只读视图）"""
+        return self._arrays[name]
+
+    def window(self, name: str, n: int) -> np.ndarray:
+        """返回最近 n 个交易日的矩阵视图"""
+        return self._arrays[name][-n:]
+
+    def series(self, symbol: str, name: str) -> np.ndarray:
+        """返回单只股票某字段的时间序列视图"""
+        return self._arrays[name][:, self.symbol_pos[symbol]]
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    @classmethod
+    def build(cls, symbols: Optional[Iterable[str]] = None, start_date: str = "20150101",
+              end_date: Optional[str] = None, adjust: str = "qfq",
+              root: Optional[str] = None) -> "UniverseMatrix":
+        """
+        从本地日线存储构建全市场矩阵，symbols为空时使用全市场快照中的全部代码。
+        批量任务，单只股票的缺失数据由日线存储增量拉取。
+        """
+        root = root or os.path.join(UNIVERSE_DIR, adjust or "none")
+        end_date = end_date or datetime.now().strftime('%Y%m%d')
+        if symbols is None:
+            symbols = get_spot_snapshot('stock_zh_a_spot_em').df['代码'].astype(str).tolist()
+        symbols = list(dict.fromkeys(symbols))
+
+        # 第一遍只收集交易日，避免同时持有全部股票的日线数据
+        store = get_store()
+        available = []
+        all_dates = set()
+        for symbol in symbols:
+            try:
+                df = store.get_history(symbol, start_date, end_date, adjust=adjust, market="a")
+            except Exception:
+                continue
+            if not df.empty:
+                available.append(symbol)
+                all_dates.update(df['日期'])
+
+        dates = sorted(all_dates)
+        date_pos = {d: i for i, d in enumerate(dates)}
+        generation = int(time.time() * 1000)
+        os.makedirs(root, exist_ok=True)
+
+        shape = (len(dates), len(symbols))
+        if not (shape[0] and shape[1]):
+            for field in FIELDS:
+                open(cls._data_path(root, field, generation), "wb").close()
+        else:
+            arrays = {
+                field: np.memmap(cls._data_path(root, field, generation), dtype=DTYPE, mode="w+", shape=shape)
+                for field in FIELDS
+            }
+            for array in arrays.values():
+                array[:] = np.nan
+            # 第二遍逐只股票写入对应列（数据已在本地存储中，不再访问网络）
+            symbol_pos = {s: j for j, s in enumerate(symbols)}
+            for symbol in available:
+                df = store.get_history(symbol, start_date, end_date, adjust=adjust, market="a")
+                rows = [date_pos[d] for d in df['日期']]
+                for field, column in HIST_COLUMNS.items():
+                    arrays[field][rows, symbol_pos[symbol]] = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=DTYPE)
+            for array in arrays.values():
+                array.flush()
+            del arrays
+
+        return cls._commit(root, {"generation": generation, "adjust": adjust,
+                                  "symbols": symbols, "dates": dates, "fields": list(FIELDS)})
+
+    def append(self, trade_date: str, values: Dict[str, np.ndarray]) -> "UniverseMatrix":
+        """
+        追加一个交易日，values 为各字段按 self.symbols 顺序排列的一维数组。
+        数据直接追加到现有文件末尾，返回包含新交易日的矩阵。
+        """
+        trade_date = pd.Timestamp(trade_date).strftime('%Y-%m-%d')
+        if trade_date in self.date_pos:
+            raise ValueError(f"交易日 {trade_date} 已存在")
+        if self.dates and trade_date < self.dates[-1]:
+            raise ValueError(f"交易日 {trade_date} 早于最后一个交易日 {self.dates[-1]}")
+        rows = {}
+        for field in FIELDS:
+            rows[field] = np.asarray(values[field], dtype=DTYPE)
+            if rows[field].shape != (len(self.symbols),):
+                raise ValueError(f"字段 {field} 长度应为 {len(self.symbols)}")
+        # 索引最后提交：写入数据后、提交索引前进程中断时，文件会比索引多出若干行，写入前先截掉
+        committed = len(self.dates) * len(self.symbols) * np.dtype(DTYPE).itemsize
+        for field, row in rows.items():
+            with open(self._data_path(self.root, field, self.generation), "r+b") as f:
+                f.truncate(committed)
+                f.seek(committed)
+                f.write(row.tobytes())
+
+        index = self._index()
+        index["dates"] = self.dates + [trade_date]
+        return self._commit(self.root, index, cleanup=False)
+
+    def append_from_spot(self, trade_date: Optional[str] = None) -> "UniverseMatrix":
+        """
+        收盘后用一次全市场快照追加当日数据，不需要逐只拉取日线。
+        前复权价格以最新价为基准，当日数据无需调整；发生除权除息的股票需定期重建。
+        未指定日期时按交易日历取快照对应的交易日：尚未收盘或该交易日已存在（如周末、节假日重复运行）时不追加。
+        """
+        if trade_date is None:
+            trading_day = last_trading_day()
+            if trading_day > last_final_date("a"):
+                print(f"交易日 {trading_day.isoformat()} 尚未收盘，跳过追加")
+                return self
+            trade_date = trading_day.isoformat()
+            if trade_date in self.date_pos:
+                print(f"交易日 {trade_date} 已存在，跳过追加")
+                return self
+        snapshot = get_spot_snapshot('stock_zh_a_spot_em')
+        values = {}
+        positions = [self.symbol_pos.get(code) for code in snapshot.df['代码'].astype(str)]
+        mask = np.array([p is not None for p in positions], dtype=bool)
+        targets = np.array([p for p in positions if p is not None], dtype=np.int64)
+        for field, column in SPOT_COLUMNS.items():
+            row = np.full(len(self.symbols), np.nan, dtype=DTYPE)
+            data = pd.to_numeric(snapshot.df[column], errors="coerce").to_numpy(dtype=DTYPE)
+            row[targets] = data[mask]
+            values[field] = row
+        return self.append(trade_date, values)
+
+    def _index(self) -> dict:
+        return {"generation": self.generation, "adjust": self.adjust, "symbols": list(self.symbols),
+                "dates": list(self.dates), "fields": list(FIELDS)}
+
+    @staticmethod
+    def _data_path(root: str, field: str, generation: int) -> str:
+        return os.path.join(root, f"{field}.{generation}.f64")
+
+    @classmethod
+    def _commit(cls, root: str, index: dict, cleanup: bool = True) -> "UniverseMatrix":
+        tmp_path = os.path.join(root, f"{INDEX_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(root, INDEX_FILE))
+        if cleanup:
+            # 删除旧代际文件；已映射这些文件的进程仍可继续读取
+            suffix = f".{index['generation']}.f64"
+            for name in os.listdir(root):
+                if name.endswith(".f64") and not name.endswith(suffix):
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError:
+                        pass
+        return cls(root, index)
+
+
+if __name__ == "__main__":
+    # 用法：python -m tools.universe_matrix build [起始日期]   或   python -m tools.universe_matrix append
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    if command == "build":
+        matrix = UniverseMatrix.build(start_date=sys.argv[2] if len(sys.argv) > 2 else "20150101")
+    elif command == "append":
+        matrix = UniverseMatrix.open().append_from_spot()
+    else:
+        raise SystemExit(f"未知命令: {command}")
+    print(f"矩阵已更新：{matrix.shape[0]} 个交易日 × {matrix.shape[1]} 只股票，最后交易日 {matrix.dates[-1] if matrix.dates else '--'}")